@@ -0,0 +1,588 @@
+"""
+OpenCV DNN detector sessions for the YOLO vehicle detectors
+Owns the cv2.dnn networks, their output layer names and preprocessing buffers
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+
+class DetectorBusyError(RuntimeError):
+    """Raised when no detector session frees up within the allowed wait"""
+
+
+class Detections:
+    """Detections for one frame as parallel NumPy arrays
+
+    boxes are int (N, 4) [x, y, width, height] in frame pixels, scores are
+    float32 (N,) and class_ids int (N,). labels maps a class ID to its name and
+    is shared by every Detections from the same model.
+    """
+    __slots__ = ('boxes', 'scores', 'class_ids', 'labels')
+
+    def __init__(self, boxes, scores, class_ids, labels):
+        self.boxes = np.asarray(boxes, dtype=int).reshape(-1, 4)
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        self.class_ids = np.asarray(class_ids, dtype=int).reshape(-1)
+        self.labels = labels
+
+    @classmethod
+    def from_xyxy(cls, data, labels, class_ids=None):
+        """Build from (N, 6) [x1, y1, x2, y2, conf, cls] rows (ultralytics boxes.data)
+
+        Args:
+            class_ids: Optional class IDs to keep; other rows are dropped
+        """
+        data = np.asarray(data, dtype=np.float32).reshape(-1, 6)
+        if class_ids is not None:
+            data = data[np.isin(data[:, 5].astype(int), class_ids)]
+        corners = data[:, :4].astype(int)
+        boxes = np.column_stack([corners[:, :2], corners[:, 2:] - corners[:, :2]])
+        return cls(boxes, data[:, 4], data[:, 5], labels)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def select(self, mask):
+        """Detections kept by a boolean mask or index array"""
+        return Detections(self.boxes[mask], self.scores[mask], self.class_ids[mask], self.labels)
+
+    def shifted(self, dx, dy):
+        """Detections with boxes moved by (dx, dy), e.g. from crop to frame coordinates"""
+        return Detections(self.boxes + [dx, dy, 0, 0], self.scores, self.class_ids, self.labels)
+
+    def breakdown(self):
+        """Count per class name"""
+        ids, counts = np.unique(self.class_ids, return_counts=True)
+        breakdown = {}
+        for class_id, count in zip(ids.tolist(), counts.tolist()):
+            label = self.labels[class_id]
+            breakdown[label] = breakdown.get(label, 0) + count
+        return breakdown
+
+    def to_json(self):
+        """Per-detection dicts for the HTTP response; only called at the API boundary
+
+        confidence keeps the response's original percentage string, e.g. "97.21%".
+        """
+        return [
+            {'type': self.labels[class_id], 'confidence': f"{score:.2%}", 'bbox': box}
+            for box, score, class_id in zip(self.boxes.tolist(), self.scores.tolist(),
+                                            self.class_ids.tolist())
+        ]
+
+
+def box_iou(boxes_a, boxes_b):
+    """Pairwise Intersection over Union between two sets of boxes
+
+    Args:
+        boxes_a: (N, 4) array-like of [x, y, width, height]
+        boxes_b: (M, 4) array-like of [x, y, width, height]
+
+    Returns:
+        (N, M) float array where [i, j] is the IoU of boxes_a[i] and boxes_b[j]
+    """
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    # Broadcast (N, 1) against (1, M) corners
+    x_left = np.maximum(a[:, None, 0], b[None, :, 0])
+    y_top = np.maximum(a[:, None, 1], b[None, :, 1])
+    x_right = np.minimum((a[:, 0] + a[:, 2])[:, None], (b[:, 0] + b[:, 2])[None, :])
+    y_bottom = np.minimum((a[:, 1] + a[:, 3])[:, None], (b[:, 1] + b[:, 3])[None, :])
+
+    intersection = np.clip(x_right - x_left, 0, None) * np.clip(y_bottom - y_top, 0, None)
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None, :] - intersection
+
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+class DetectorSession:
+    def __init__(self, config_path, weights_path, labels, vehicle_types,
+                 input_size=416, confidence=0.5, threshold=0.3, model_format='yolov3'):
+        """Load the network and resolve everything reused per frame
+
+        Args:
+            config_path: Darknet .cfg file (unused for 'yolov8')
+            weights_path: Darknet .weights file, or .onnx file for 'yolov8'
+            labels: Class names indexed by class ID
+            vehicle_types: Class names kept as vehicles
+            input_size: Square network input size in pixels (multiple of 32)
+            confidence: Default class confidence threshold
+            threshold: Default NMS threshold
+            model_format: 'yolov3' for Darknet YOLOv3 / YOLOv3-tiny, or 'yolov8'
+                          for an ultralytics YOLOv8 ONNX export
+        """
+        if model_format not in ('yolov3', 'yolov8'):
+            raise ValueError(f"Unknown model format: {model_format}")
+        self.model_format = model_format
+        if model_format == 'yolov8':
+            self.net = cv2.dnn.readNetFromONNX(weights_path)
+        else:
+            self.net = cv2.dnn.readNetFromDarknet(config_path, weights_path)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+        # Output layer names never change for a loaded network
+        ln = self.net.getLayerNames()
+        self.output_layers = [ln[i - 1] for i in self.net.getUnconnectedOutLayers().flatten()]
+
+        self.labels = labels
+        # Boolean lookup indexed by class ID, used to drop non-vehicle rows before NMS
+        self.vehicle_class_mask = np.array([label in vehicle_types for label in labels])
+
+        self.confidence = confidence
+        self.threshold = threshold
+        self.input_size = int(input_size)  # Default; any multiple of 32 can be passed per call
+        # Preprocessing buffers per input size: {size: [resized, blob, batch blob]}
+        self._buffers = {}
+        # ONNX exports without dynamic axes only accept a batch of one
+        self._batching = True
+
+    def _buffers_for(self, size):
+        buffers = self._buffers.get(size)
+        if buffers is None:
+            buffers = self._buffers[size] = [np.empty((size, size, 3), dtype=np.uint8),
+                                             np.empty((1, 3, size, size), dtype=np.float32),
+                                             None]
+        return buffers
+
+    def _fill_blob(self, frame, out, size):
+        """Resize a BGR frame into out (3, size, size) as scaled RGB"""
+        resized = self._buffers_for(size)[0]
+        cv2.resize(frame, (size, size), dst=resized)
+        # HWC BGR -> CHW RGB, scaled to [0, 1]
+        np.multiply(resized[:, :, ::-1].transpose(2, 0, 1), 1 / 255.0,
+                    out=out, casting='unsafe')
+
+    def prepare_blob(self, frame, input_size=None):
+        """Fill the reusable input blob from a BGR frame
+
+        Equivalent to cv2.dnn.blobFromImage(frame, 1/255.0, (size, size),
+        swapRB=True, crop=False) without allocating a new blob per call.
+        """
+        size = input_size or self.input_size
+        blob = self._buffers_for(size)[1]
+        self._fill_blob(frame, blob[0], size)
+        return blob
+
+    def prepare_batch_blob(self, frames, input_size=None):
+        """Fill the reusable batch blob from a list of BGR frames
+
+        Equivalent to cv2.dnn.blobFromImages(frames, 1/255.0, (size, size),
+        swapRB=True, crop=False). The buffer only grows, so batches of varying
+        size reuse the same memory.
+        """
+        size = input_size or self.input_size
+        buffers = self._buffers_for(size)
+        if buffers[2] is None or len(buffers[2]) < len(frames):
+            buffers[2] = np.empty((len(frames), 3, size, size), dtype=np.float32)
+        for i, frame in enumerate(frames):
+            self._fill_blob(frame, buffers[2][i], size)
+        return buffers[2][:len(frames)]
+
+    def forward(self, frame, input_size=None):
+        """Run one forward pass and return the raw output layer arrays"""
+        self.net.setInput(self.prepare_blob(frame, input_size))
+        return self.net.forward(self.output_layers)
+
+    def forward_batch(self, frames, input_size=None):
+        """Run one batched forward pass over several frames
+
+        Returns:
+            One list of raw output layer arrays per frame, in input order
+        """
+        if len(frames) == 1 or not self._batching:
+            return [self.forward(frame, input_size) for frame in frames]
+        self.net.setInput(self.prepare_batch_blob(frames, input_size))
+        try:
+            outputs = self.net.forward(self.output_layers)
+        except cv2.error:
+            self._batching = False
+            return [self.forward(frame, input_size) for frame in frames]
+        # Batched outputs gain a leading batch axis: (batch, rows, 85) for
+        # YOLOv3 layers, (batch, 84, anchors) for YOLOv8
+        return [[output[i] for output in outputs] for i in range(len(frames))]
+
+    def decode(self, layer_outputs, W, H, confidence, input_size=None):
+        """Decode raw YOLO layer outputs into vehicle candidates in one NumPy pass
+
+        Rows from all output layers are stacked, filtered by class confidence and
+        vehicle class ID, and scaled to pixel [x, y, w, h] boxes together.
+
+        Returns:
+            (boxes, confidences, classIDs) as int (N, 4), float32 (N,) and int (N,) arrays
+        """
+        if self.model_format == 'yolov8':
+            # (1, 84, anchors) or (84, anchors) -> (anchors, 84); boxes are in
+            # network input pixels and there is no objectness column
+            output = layer_outputs[0]
+            outputs = (output[0] if output.ndim == 3 else output).T
+            scores = outputs[:, 4:]
+            scale = np.array([W, H, W, H], dtype=np.float32) / (input_size or self.input_size)
+        else:
+            outputs = np.vstack(layer_outputs)
+            scores = outputs[:, 5:]
+            scale = np.array([W, H, W, H], dtype=np.float32)
+        classIDs = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), classIDs]
+
+        keep = (confidences > confidence) & self.vehicle_class_mask[classIDs]
+        outputs = outputs[keep]
+        confidences = confidences[keep]
+        classIDs = classIDs[keep]
+
+        # (centerX, centerY, width, height) -> top-left (x, y, width, height)
+        box = (outputs[:, 0:4] * scale).astype(int)
+        boxes = np.empty_like(box)
+        boxes[:, 0] = (box[:, 0] - box[:, 2] / 2).astype(int)
+        boxes[:, 1] = (box[:, 1] - box[:, 3] / 2).astype(int)
+        boxes[:, 2:] = box[:, 2:]
+
+        return boxes, confidences, classIDs
+
+    def detect(self, frame, confidence=None, threshold=None, input_size=None):
+        """Detect vehicles in a BGR frame
+
+        Args:
+            frame: Image frame to process
+            confidence: Class confidence threshold (defaults to self.confidence)
+            threshold: NMS threshold (defaults to self.threshold)
+            input_size: Network input size (defaults to self.input_size)
+
+        Returns:
+            (boxes, confidences, classIDs) for the detections kept by NMS
+        """
+        confidence = self.confidence if confidence is None else confidence
+        threshold = self.threshold if threshold is None else threshold
+        (H, W) = frame.shape[:2]
+
+        layer_outputs = self.forward(frame, input_size)
+        return self._suppress(self.decode(layer_outputs, W, H, confidence, input_size),
+                              confidence, threshold)
+
+    def detect_batch(self, frames, confidence=None, threshold=None, input_size=None):
+        """Detect vehicles in several BGR frames with a single forward pass
+
+        Frames may have different sizes; each is resized to the network input.
+
+        Returns:
+            One (boxes, confidences, classIDs) tuple per frame, in input order
+        """
+        if not frames:
+            return []
+        confidence = self.confidence if confidence is None else confidence
+        threshold = self.threshold if threshold is None else threshold
+
+        results = []
+        for frame, layer_outputs in zip(frames, self.forward_batch(frames, input_size)):
+            (H, W) = frame.shape[:2]
+            candidates = self.decode(layer_outputs, W, H, confidence, input_size)
+            results.append(self._suppress(candidates, confidence, threshold))
+        return results
+
+    def _suppress(self, candidates, confidence, threshold):
+        """Apply NMS to decoded candidates and keep the surviving rows"""
+        boxes, confidences, classIDs = candidates
+        idxs = cv2.dnn.NMSBoxes(boxes.tolist(), confidences.tolist(), confidence, threshold)
+        idxs = np.asarray(idxs, dtype=int).flatten()
+
+        return boxes[idxs], confidences[idxs], classIDs[idxs]
+
+
+class DetectorPool:
+    def __init__(self, factory, size=2, max_waiting=16, timeout=30.0):
+        """Pool of independent detector sessions shared by request threads
+
+        A cv2.dnn net is not safe to use from several threads at once, so each
+        caller checks out a whole session for the duration of its forward pass.
+
+        Args:
+            factory: Callable returning a new DetectorSession
+            size: Number of sessions (nets) to load
+            max_waiting: Callers allowed to queue for a session before new
+                         ones are rejected with DetectorBusyError
+            timeout: Seconds a queued caller waits before DetectorBusyError
+        """
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self._factory = factory
+        self._sessions_lock = threading.Lock()
+        self._admission = threading.BoundedSemaphore(self.size + max(0, int(max_waiting)))
+        self._idle = queue.LifoQueue()
+
+        # Split the CPU between the nets instead of letting every net spawn
+        # one OpenCV worker thread per core
+        cv2.setNumThreads(max(1, (os.cpu_count() or 1) // self.size))
+
+        self.sessions = [factory() for _ in range(self.size)]
+        for session in self.sessions:
+            self._idle.put(session)
+
+    @contextmanager
+    def session(self, timeout=None):
+        """Check out a session for exclusive use by the calling thread"""
+        if not self._admission.acquire(blocking=False):
+            raise DetectorBusyError("Detector queue is full, try again later")
+        try:
+            try:
+                session = self._idle.get(timeout=self.timeout if timeout is None else timeout)
+            except queue.Empty:
+                raise DetectorBusyError("Timed out waiting for a free detector") from None
+            try:
+                yield session
+            finally:
+                if getattr(session, 'broken', False):
+                    self._replace(session)
+                else:
+                    self._idle.put(session)
+        finally:
+            self._admission.release()
+
+    def _replace(self, session):
+        """Restart a broken session (e.g. a dead inference worker) in the background
+
+        The pool runs one session short until the replacement is ready; if it
+        cannot be started the session is dropped.
+        """
+        def restart():
+            try:
+                session.close()
+            except Exception:
+                pass
+            try:
+                replacement = self._factory()
+            except Exception as e:
+                print(f"⚠ Could not restart detector session: {e}")
+                with self._sessions_lock:
+                    self.sessions.remove(session)
+                return
+            with self._sessions_lock:
+                self.sessions[self.sessions.index(session)] = replacement
+            self._idle.put(replacement)
+            print("✓ Detector session restarted")
+
+        print("⚠ Detector session failed, restarting it")
+        threading.Thread(target=restart, name='detector-restart', daemon=True).start()
+
+    def detect(self, frame, confidence=None, threshold=None, input_size=None):
+        """DetectorSession.detect on the next free session"""
+        with self.session() as session:
+            return session.detect(frame, confidence, threshold, input_size)
+
+    def detect_batch(self, frames, confidence=None, threshold=None, input_size=None):
+        """DetectorSession.detect_batch on the next free session"""
+        with self.session() as session:
+            return session.detect_batch(frames, confidence, threshold, input_size)
+
+
+class MicroBatcher:
+    def __init__(self, pool, max_batch_size=8, max_wait=0.005, max_waiting=16, timeout=30.0):
+        """Merge single-frame requests from concurrent callers into batched forward passes
+
+        One dispatcher thread per pool session takes the oldest pending frame,
+        keeps collecting until max_batch_size frames or max_wait seconds after
+        that first frame, runs one detect_batch and hands each caller its result.
+
+        Args:
+            pool: DetectorPool whose sessions run the batches
+            max_batch_size: Most frames in one forward pass
+            max_wait: Most seconds a frame waits for others to join its batch
+            max_waiting: Frames allowed to queue before new ones are rejected
+                         with DetectorBusyError, as in DetectorPool
+            timeout: Seconds a queued caller waits for its result before
+                     DetectorBusyError
+        """
+        self.pool = pool
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._pending = queue.Queue(maxsize=max(1, int(max_waiting)))
+
+        for i in range(pool.size):
+            threading.Thread(target=self._dispatch, name=f"micro-batcher-{i}", daemon=True).start()
+
+    def submit(self, frame, confidence=None, threshold=None, input_size=None):
+        """Queue one frame; returns a Future for its (boxes, confidences, classIDs)"""
+        future = Future()
+        try:
+            self._pending.put_nowait((frame, confidence, threshold, input_size, future))
+        except queue.Full:
+            raise DetectorBusyError("Detector queue is full, try again later") from None
+        return future
+
+    def detect(self, frame, confidence=None, threshold=None, input_size=None):
+        """Same result as DetectorSession.detect, batched with concurrent callers"""
+        return self._result(self.submit(frame, confidence, threshold, input_size))
+
+    def detect_batch(self, frames, confidence=None, threshold=None, input_size=None):
+        """Same result as DetectorSession.detect_batch, batched with concurrent callers"""
+        futures = [self.submit(frame, confidence, threshold, input_size) for frame in frames]
+        return [self._result(future) for future in futures]
+
+    def _result(self, future):
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise DetectorBusyError("Timed out waiting for a free detector") from None
+
+    def _collect(self):
+        """Block for the next frame, then gather more until the batch is full or due"""
+        batch = [self._pending.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._pending.get(timeout=remaining) if remaining > 0
+                             else self._pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch(self):
+        while True:
+            batch = self._collect()
+
+            # Thresholds and input size apply per batch, so split requests by settings
+            groups = {}
+            for request in batch:
+                groups.setdefault(request[1:4], []).append(request)
+
+            for (confidence, threshold, input_size), requests in groups.items():
+                frames = [request[0] for request in requests]
+                try:
+                    results = self.pool.detect_batch(frames, confidence, threshold, input_size)
+                except Exception as e:
+                    for request in requests:
+                        request[-1].set_exception(e)
+                    continue
+                for request, result in zip(requests, results):
+                    request[-1].set_result(result)
+
+
+class SizedDetector:
+    def __init__(self, detector, input_size):
+        """A detector shared by several tiers, run at one tier's input size"""
+        self.detector = detector
+        self.input_size = input_size
+        self.pool = getattr(detector, 'pool', detector)
+
+    def detect(self, frame, confidence=None, threshold=None):
+        return self.detector.detect(frame, confidence, threshold, self.input_size)
+
+    def detect_batch(self, frames, confidence=None, threshold=None):
+        return self.detector.detect_batch(frames, confidence, threshold, self.input_size)
+
+
+class ModelRegistry:
+    def __init__(self, tiers, build_detector):
+        """Named detector tiers, each loaded the first time it is used
+
+        Tiers that differ only in input size (e.g. YOLOv3 at 608/416/320)
+        share one detector, and so one set of nets; each call passes its
+        tier's input size.
+
+        Args:
+            tiers: {name: settings} where settings hold the DetectorSession
+                   model_format, config_path, weights_path and input_size
+            build_detector: Callable(name, settings) returning an object with
+                            detect / detect_batch taking an input_size (a pool
+                            or micro-batcher)
+        """
+        self.tiers = tiers
+        self._build_detector = build_detector
+        self._detectors = {}  # Model key -> shared detector
+        self._sized = {}      # Tier name -> SizedDetector
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _model_key(settings):
+        return (settings.get('model_format', 'yolov3'), settings.get('config_path'),
+                settings.get('weights_path'))
+
+    def is_available(self, name):
+        """True when the tier is registered and its model files exist"""
+        settings = self.tiers.get(name)
+        if settings is None:
+            return False
+        paths = [settings.get('config_path'), settings.get('weights_path')]
+        return all(os.path.exists(path) for path in paths if path)
+
+    def available(self):
+        """Names of the tiers that can be loaded, in registry order"""
+        return [name for name in self.tiers if self.is_available(name)]
+
+    def loaded(self):
+        """Names of the tiers whose nets are already loaded"""
+        return [name for name, settings in self.tiers.items()
+                if self._model_key(settings) in self._detectors]
+
+    def get(self, name):
+        """Return the detector for a tier, building its model on first use"""
+        detector = self._sized.get(name)
+        if detector is not None:
+            return detector
+        with self._lock:
+            if name not in self._sized:
+                if not self.is_available(name):
+                    raise ValueError(f"Model tier not available: {name}")
+                settings = self.tiers[name]
+                key = self._model_key(settings)
+                if key not in self._detectors:
+                    self._detectors[key] = self._build_detector(name, settings)
+                self._sized[name] = SizedDetector(self._detectors[key], settings.get('input_size'))
+            return self._sized[name]
+
+
+class TierController:
+    def __init__(self, ladder, target_latency, recover_ratio=0.5, smoothing=0.2, cooldown=5.0):
+        """Step down to cheaper model tiers while detection latency is over target
+
+        Args:
+            ladder: Tier names from most accurate to cheapest
+            target_latency: Seconds per detection call (queueing included)
+                            above which the next cheaper tier is used
+            recover_ratio: Step back up once latency falls below
+                           target_latency * recover_ratio
+            smoothing: Weight of the newest sample in the moving average
+            cooldown: Minimum seconds between two tier changes
+        """
+        self.ladder = list(ladder)
+        self.target_latency = target_latency
+        self.recover_ratio = recover_ratio
+        self.smoothing = smoothing
+        self.cooldown = cooldown
+        self.level = 0
+        self.latency = 0.0
+        self._changed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        """Feed one measured detection latency in seconds"""
+        with self._lock:
+            self.latency += self.smoothing * (latency - self.latency)
+            now = time.monotonic()
+            if now - self._changed_at < self.cooldown:
+                return
+            if self.latency > self.target_latency and self.level < len(self.ladder) - 1:
+                self.level += 1
+                self._changed_at = now
+                print(f"⚠ Detection latency {self.latency:.2f}s over target, "
+                      f"switching to {self.ladder[self.level]}")
+            elif self.latency < self.target_latency * self.recover_ratio and self.level > 0:
+                self.level -= 1
+                self._changed_at = now
+                print(f"✓ Detection latency {self.latency:.2f}s recovered, "
+                      f"switching to {self.ladder[self.level]}")
+
+    def select(self, requested):
+        """The tier to run for a request: never more expensive than requested"""
+        if requested not in self.ladder:
+            return requested
+        return self.ladder[max(self.ladder.index(requested), self.level)]
@@ -0,0 +1,62 @@
+"""
+Emergency vehicle watch for the live camera feed
+Decides when a camera's live frame should also go through the emergency
+model, and confirms hits over several runs before raising a priority event
+"""
+import time
+from collections import deque
+
+
+class EmergencyWatch:
+    def __init__(self, interval=1.0, min_interval=0.25, confirm_hits=3, window=5):
+        """
+        Args:
+            interval: Seconds between emergency model runs on a quiet feed
+            min_interval: Shortest gap between runs when new vehicles appear
+            confirm_hits: Runs with a detection needed to confirm an emergency
+            window: Number of most recent runs confirm_hits is counted over
+        """
+        self.interval = interval
+        self.min_interval = min_interval
+        self.confirm_hits = confirm_hits
+
+        self.active = False
+        # Emergency detections from the latest run, or while an emergency is
+        # active from the latest run that found one, so its lanes stay known
+        # through the misses that do not clear it
+        self.detections = None
+        self.since = None       # When the current emergency was confirmed
+        self._hits = deque(maxlen=window)
+        self._last_run = 0.0
+
+    def due(self, new_vehicles=False):
+        """Whether this frame should go through the emergency model
+
+        Args:
+            new_vehicles: The tracker started new tracks on this frame
+        """
+        elapsed = time.time() - self._last_run
+        return elapsed >= self.interval or (new_vehicles and elapsed >= self.min_interval)
+
+    def record(self, detections):
+        """Record one emergency model run
+
+        Returns:
+            'confirmed' when an emergency is confirmed, 'cleared' when a
+            confirmed emergency has had no hits for a whole window, else None
+        """
+        self._last_run = time.time()
+        if len(detections) > 0 or not self.active:
+            self.detections = detections
+        self._hits.append(len(detections) > 0)
+
+        if not self.active and sum(self._hits) >= self.confirm_hits:
+            self.active = True
+            self.since = self._last_run
+            return 'confirmed'
+        if self.active and len(self._hits) == self._hits.maxlen and not any(self._hits):
+            self.active = False
+            self.since = None
+            self.detections = detections
+            return 'cleared'
+        return None
@@ -0,0 +1,252 @@
+"""
+Out-of-process inference workers for the detection models
+Each worker process loads YOLOv3 (OpenCV), YOLOv8 and best.pt once and receives
+decoded frames through shared memory instead of pickled pixel arrays
+"""
+import os
+import subprocess
+import sys
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+AUTHKEY_ENV = 'INFERENCE_WORKER_AUTHKEY'
+
+
+class InferenceWorkerError(RuntimeError):
+    """Raised when a worker process fails to start or to run a request"""
+
+
+def start_worker_process(script, startup_timeout=300.0):
+    """Run a worker script as its own process and wait for it to connect back
+
+    The worker runs as a script rather than through multiprocessing, so it
+    never re-imports the Flask backend module.
+
+    Returns:
+        (subprocess.Popen, Connection)
+    """
+    authkey = os.urandom(32)
+    listener = Listener(family='AF_INET', authkey=authkey)
+    env = dict(os.environ, **{AUTHKEY_ENV: authkey.hex()})
+    host, port = listener.address
+    process = subprocess.Popen([sys.executable, os.path.abspath(script), host, str(port)], env=env)
+
+    accepted = []
+    accept_thread = threading.Thread(target=lambda: accepted.append(listener.accept()), daemon=True)
+    accept_thread.start()
+    accept_thread.join(startup_timeout)
+    listener.close()
+    if not accepted:
+        process.kill()
+        raise InferenceWorkerError("Worker process did not connect")
+    return process, accepted[0]
+
+
+def connect_to_parent(host, port):
+    """Worker side of start_worker_process"""
+    return Client((host, port), authkey=bytes.fromhex(os.environ.pop(AUTHKEY_ENV)))
+
+
+class InferenceWorker:
+    def __init__(self, config, startup_timeout=300.0):
+        """Start one worker process and wait until its models are loaded
+
+        Args:
+            config: Dict with 'opencv' (DetectorSession keyword arguments),
+                    'live_model' and 'emergency_model' (ultralytics weight
+                    paths or None) and 'num_threads' (OpenCV threads)
+            startup_timeout: Seconds to wait for the models to load
+        """
+        self.process, self.conn = start_worker_process(__file__, startup_timeout)
+
+        self.shm = None
+        self.broken = False  # Set once the process is gone; DetectorPool replaces it
+        self.conn.send(config)
+        if not self.conn.poll(startup_timeout):
+            self.close()
+            raise InferenceWorkerError("Inference worker did not finish loading models")
+        status, payload = self.conn.recv()
+        if status != 'ready':
+            self.close()
+            raise InferenceWorkerError(f"Inference worker failed to start: {payload}")
+
+        # {'opencv': bool, 'live': bool, 'emergency': bool, 'device': str}
+        self.models = payload
+
+    def _write_frames(self, frames):
+        """Copy frames into this worker's shared memory block, growing it if needed"""
+        frames = [np.ascontiguousarray(frame) for frame in frames]
+        layout = []
+        offset = 0
+        for frame in frames:
+            layout.append((offset, frame.shape, frame.dtype.str))
+            offset += frame.nbytes
+
+        if self.shm is None or self.shm.size < offset:
+            self._release_shm()
+            self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+
+        for frame, (start, shape, dtype) in zip(frames, layout):
+            view = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=start)
+            view[...] = frame
+            del view
+        return layout
+
+    def _call(self, op, frames, **kwargs):
+        """Send one request and block until its detection arrays come back"""
+        layout = self._write_frames(frames)
+        try:
+            self.conn.send((op, self.shm.name, layout, kwargs))
+            status, payload = self.conn.recv()
+        except (EOFError, OSError) as e:
+            self.broken = True
+            raise InferenceWorkerError(f"Inference worker exited: {e}") from None
+        if status != 'ok':
+            raise InferenceWorkerError(payload)
+        return payload
+
+    def detect(self, frame, confidence=None, threshold=None, input_size=None):
+        """DetectorSession.detect run in the worker"""
+        return self._call('detect', [frame], confidence=confidence, threshold=threshold,
+                          input_size=input_size)[0]
+
+    def detect_batch(self, frames, confidence=None, threshold=None, input_size=None):
+        """DetectorSession.detect_batch run in the worker"""
+        if not frames:
+            return []
+        return self._call('detect', frames, confidence=confidence, threshold=threshold,
+                          input_size=input_size)
+
+    def detect_live(self, frames, confidence):
+        """Run the YOLOv8 live model; returns one (N, 6) x1, y1, x2, y2, conf, cls array per frame"""
+        return self._call('live', frames, confidence=confidence)
+
+    def detect_emergency(self, frames, confidence):
+        """Run the best.pt model; returns one (N, 6) x1, y1, x2, y2, conf, cls array per frame"""
+        return self._call('emergency', frames, confidence=confidence)
+
+    def _release_shm(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def close(self):
+        """Stop the worker process and free its shared memory"""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.conn.close()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self._release_shm()
+
+
+# =============================================================================
+# WORKER PROCESS
+# =============================================================================
+
+def _attach_shared_memory(name):
+    """Attach to a block owned by the web process without tracking it here"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == 'posix':
+            # Otherwise this process's resource tracker unlinks the block on exit
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def _load_models(config):
+    """Load every configured model once; missing optional models are skipped"""
+    import cv2
+    from detector import DetectorSession
+
+    cv2.setNumThreads(config.get('num_threads', 1))
+    models = {'opencv': DetectorSession(**config['opencv'])}
+    status = {'opencv': True, 'live': False, 'emergency': False, 'device': 'CPU (OpenCV)'}
+
+    if config.get('live_model') or config.get('emergency_model'):
+        try:
+            import torch
+            from ultralytics import YOLO
+        except ImportError as e:
+            print(f"⚠ Inference worker: PyTorch not available: {e}")
+            return models, status
+
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        models['device'] = device
+        for key in ('live', 'emergency'):
+            path = config.get(f'{key}_model')
+            if not path:
+                continue
+            try:
+                models[key] = YOLO(path)
+                models[key].to(device)
+                status[key] = True
+            except Exception as e:
+                print(f"⚠ Inference worker: could not load {path}: {e}")
+        if status['live']:
+            status['device'] = f"GPU: {torch.cuda.get_device_name(0)}" if device == 'cuda' else "CPU (PyTorch)"
+
+    return models, status
+
+
+def _run(models, op, frames, kwargs):
+    if op == 'detect':
+        return models['opencv'].detect_batch(frames, kwargs.get('confidence'), kwargs.get('threshold'),
+                                             kwargs.get('input_size'))
+    if op not in ('live', 'emergency') or op not in models:
+        raise ValueError(f"Model not available in inference worker: {op}")
+    results = models[op](frames, conf=kwargs['confidence'], device=models['device'], verbose=False)
+    return [result.boxes.data.cpu().numpy() for result in results]
+
+
+def serve(host, port):
+    """Worker main loop: load models, then answer requests until the web process goes away"""
+    conn = connect_to_parent(host, port)
+    config = conn.recv()
+    try:
+        models, status = _load_models(config)
+    except Exception as e:
+        conn.send(('error', str(e)))
+        return
+    conn.send(('ready', status))
+
+    shm = None
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        op, shm_name, layout, kwargs = message
+        if shm is None or shm.name != shm_name:
+            if shm is not None:
+                shm.close()
+            shm = _attach_shared_memory(shm_name)
+
+        frames = [np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+                  for offset, shape, dtype in layout]
+        try:
+            conn.send(('ok', _run(models, op, frames, kwargs)))
+        except Exception as e:
+            conn.send(('error', str(e)))
+        # Views must be gone before the block can be closed or replaced
+        del frames
+
+    if shm is not None:
+        shm.close()
+
+
+if __name__ == '__main__':
+    serve(sys.argv[1], int(sys.argv[2]))
@@ -0,0 +1,72 @@
+"""
+Lane polygons for a camera
+Detection runs only on the crop around the lanes, and each detected vehicle
+is assigned to the lane polygon containing its bottom-centre point
+"""
+import numpy as np
+
+
+def points_in_polygon(points, polygon):
+    """Even-odd ray casting test for many points against one polygon
+
+    Args:
+        points: (N, 2) array of [x, y]
+        polygon: (V, 2) array of vertices
+
+    Returns:
+        (N,) bool array
+    """
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+    polygon = np.asarray(polygon, dtype=np.float32).reshape(-1, 2)
+    x = points[:, 0][:, None]
+    y = points[:, 1][:, None]
+    x1, y1 = polygon[:, 0], polygon[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+
+    # (N, V): edges whose y-span contains the point and whose crossing lies to its right
+    spans = (y1 > y) != (y2 > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crossing_x = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    crossings = spans & (x < crossing_x)
+    return (np.count_nonzero(crossings, axis=1) % 2) == 1
+
+
+class LaneRegions:
+    def __init__(self, lanes):
+        """
+        Args:
+            lanes: Dict of lane name -> polygon [[x, y], ...] in frame pixels
+        """
+        self.names = list(lanes)
+        self.polygons = [np.asarray(polygon, dtype=np.int32).reshape(-1, 2) for polygon in lanes.values()]
+
+        vertices = np.concatenate(self.polygons)
+        x_min, y_min = vertices.min(axis=0)
+        x_max, y_max = vertices.max(axis=0)
+        self.rect = (int(x_min), int(y_min), int(x_max), int(y_max))
+
+    def crop(self, frame):
+        """View of the frame's bounding rectangle around every lane
+
+        Returns:
+            (crop, (x offset, y offset))
+        """
+        H, W = frame.shape[:2]
+        x_min, y_min, x_max, y_max = self.rect
+        x0, y0 = max(0, x_min), max(0, y_min)
+        x1, y1 = min(W, x_max + 1), min(H, y_max + 1)
+        return frame[y0:y1, x0:x1], (x0, y0)
+
+    def assign(self, boxes):
+        """Lane index for each [x, y, w, h] box by its bottom-centre point, -1 for none"""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        points = np.column_stack([boxes[:, 0] + boxes[:, 2] / 2, boxes[:, 1] + boxes[:, 3]])
+        lanes = np.full(len(boxes), -1, dtype=int)
+        for idx, polygon in enumerate(self.polygons):
+            lanes[(lanes == -1) & points_in_polygon(points, polygon)] = idx
+        return lanes
+
+    def counts(self, lanes):
+        """Vehicles per lane name from assign() output"""
+        counts = np.bincount(lanes[lanes >= 0], minlength=len(self.names))
+        return dict(zip(self.names, counts.tolist()))
@@ -0,0 +1,473 @@
+"""
+Pipelined live camera processing
+Capture, inference and JPEG encoding run on their own threads and hand frames
+to the next stage through single-slot handoffs, so a slow stage skips stale
+frames instead of queueing them. Detection threads are shared by every camera
+through a DetectionScheduler
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+import cv2
+
+
+class LatestValue:
+    """Latest-value-wins handoff between threads
+
+    put() replaces any value that has not been read yet; readers wait for a
+    value newer than the last sequence number they saw.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._value = None
+        self._seq = 0
+        self._closed = False
+
+    def put(self, value):
+        with self._cond:
+            self._value = value
+            self._seq += 1
+            self._cond.notify_all()
+
+    def get(self, after=0, timeout=None):
+        """Wait for a value newer than sequence number `after`
+
+        Returns:
+            (value, seq), or (None, after) on timeout or once closed
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after or self._closed, timeout)
+            if self._seq > after and not self._closed:
+                return self._value, self._seq
+            return None, after
+
+    def close(self):
+        """Wake every reader; get() returns None from now on"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def seq(self):
+        return self._seq
+
+
+class LivePipeline:
+    def __init__(self, source, process, scheduler, fps=15, priority=0, loop=False,
+                 width=640, height=480, on_fps=None):
+        """Capture -> detection -> JPEG encode for one camera
+
+        Capture and encoding run on this pipeline's own threads; detection runs
+        on the DetectionScheduler threads shared by every camera.
+
+        Args:
+            source: cv2.VideoCapture source (webcam index, URL or file path)
+            process: Called with each frame picked for detection; returns the
+                     annotated frame to encode
+            scheduler: DetectionScheduler that runs `process`
+            fps: Target detections per second for this camera
+            priority: Higher priority cameras are served first when the
+                      scheduler cannot keep up with every camera
+            loop: Restart from the first frame at end of stream and read at the
+                  file's frame rate (a video file standing in for a camera)
+            width, height: Requested capture resolution
+            on_fps: Optional callback receiving the detections per second
+        """
+        self.source = source
+        self.process = process
+        self.scheduler = scheduler
+        self.fps = fps
+        self.priority = priority
+        self.loop = loop
+        self.width = width
+        self.height = height
+        self.on_fps = on_fps
+
+        self.frames = LatestValue()     # Raw captured frames
+        self.annotated = LatestValue()  # Frames returned by process()
+
+        # (JPEG quality, scale) -> {'slot': LatestValue of JPEG bytes, 'viewers': int}
+        # Each encoding in use is produced once per frame however many viewers
+        # share it; nothing is encoded while nobody is watching
+        self._encodings = {}
+        self._encodings_lock = threading.Lock()
+
+        # Detection state, guarded by the scheduler
+        self.next_due = 0.0
+        self.busy = False
+        self._seq = 0
+        self._processed = 0
+        self._window_start = time.time()
+
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Start the capture and encode threads; returns at once"""
+        for target in (self._capture, self._encode):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self.scheduler.add(self)
+        return self
+
+    def stop(self):
+        """Stop every stage and release the camera"""
+        self._stop.set()
+        self.scheduler.remove(self)
+        for slot in (self.frames, self.annotated):
+            slot.close()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=5)
+
+    @property
+    def closed(self):
+        """True once capture has ended or the pipeline was stopped"""
+        return self.annotated.closed
+
+    def acquire_encoding(self, quality, scale=1.0):
+        """LatestValue of JPEG bytes at this quality and scale; call release_encoding when done"""
+        key = (quality, scale)
+        with self._encodings_lock:
+            encoding = self._encodings.get(key)
+            if encoding is None:
+                encoding = self._encodings[key] = {'slot': LatestValue(), 'viewers': 0}
+                if self.closed:
+                    encoding['slot'].close()
+            encoding['viewers'] += 1
+            return encoding['slot']
+
+    def release_encoding(self, quality, scale=1.0):
+        key = (quality, scale)
+        with self._encodings_lock:
+            encoding = self._encodings[key]
+            encoding['viewers'] -= 1
+            if encoding['viewers'] == 0:
+                del self._encodings[key]
+
+    def has_new_frame(self):
+        return self.frames.seq > self._seq
+
+    def detect_latest(self):
+        """Run detection on the newest captured frame (called by the scheduler)"""
+        frame, self._seq = self.frames.get(self._seq, timeout=0)
+        if frame is None:
+            return
+        self.next_due = time.time() + 1.0 / self.fps
+        try:
+            self.annotated.put(self.process(frame))
+        except Exception as e:
+            print(f"⚠ Live detection failed: {e}")
+            return
+
+        self._processed += 1
+        elapsed = time.time() - self._window_start
+        if elapsed >= 1.0:
+            if self.on_fps is not None:
+                self.on_fps(self._processed / elapsed)
+            self._processed = 0
+            self._window_start = time.time()
+
+    def _capture(self):
+        # The camera is opened on this thread because opening a network stream
+        # can block for seconds. Reading continuously keeps the driver buffer
+        # drained, so detection always gets the newest frame rather than one
+        # that queued up behind it
+        camera = cv2.VideoCapture(self.source)
+        try:
+            camera.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+            camera.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+            frame_interval = 0.0
+            if self.loop:
+                frame_interval = 1.0 / (camera.get(cv2.CAP_PROP_FPS) or 25)
+            while not self._stop.is_set():
+                success, frame = camera.read()
+                if not success and self.loop:
+                    camera.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    success, frame = camera.read()
+                if not success:
+                    break
+                self.frames.put(frame)
+                self.scheduler.wake()
+                if frame_interval:
+                    self._stop.wait(frame_interval)
+        finally:
+            camera.release()
+            self.frames.close()
+            # End of stream: no more detections, and viewers see the stream end
+            self.scheduler.remove(self)
+            self.annotated.close()
+
+    def _encode(self):
+        seq = 0
+        try:
+            while True:
+                frame, seq = self.annotated.get(seq)
+                if frame is None:
+                    break
+                with self._encodings_lock:
+                    encodings = [(key, encoding['slot']) for key, encoding in self._encodings.items()]
+
+                scaled = {1.0: frame}
+                for (quality, scale), slot in encodings:
+                    if scale not in scaled:
+                        scaled[scale] = cv2.resize(frame, None, fx=scale, fy=scale,
+                                                   interpolation=cv2.INTER_AREA)
+                    ret, buffer = cv2.imencode('.jpg', scaled[scale], [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+                    if ret:
+                        slot.put(buffer.tobytes())
+        finally:
+            with self._encodings_lock:
+                for encoding in self._encodings.values():
+                    encoding['slot'].close()
+
+
+class StreamAdapter:
+    def __init__(self, levels, level=0, drop_threshold=0.3, recover_frames=50):
+        """Pick a stream level for one client from the frames it misses
+
+        A client whose connection backs up cannot take frames as fast as they
+        are encoded, so it skips some. When the smoothed share of frames with
+        skips rises above drop_threshold the client moves one level down
+        (cheaper); after recover_frames frames in a row without skips it moves
+        one level back up.
+
+        Args:
+            levels: Number of levels, 0 being the best quality
+            level: Starting level
+        """
+        self.levels = levels
+        self.level = level
+        self.drop_threshold = drop_threshold
+        self.recover_frames = recover_frames
+        self._drop_rate = 0.0
+        self._clean = 0
+
+    def record(self, skipped):
+        """Record one delivered frame and how many frames were skipped before it"""
+        self._drop_rate = 0.8 * self._drop_rate + 0.2 * (1.0 if skipped else 0.0)
+        self._clean = 0 if skipped else self._clean + 1
+        if self._drop_rate > self.drop_threshold and self.level < self.levels - 1:
+            self.level += 1
+            self._drop_rate = 0.0
+        elif self._clean >= self.recover_frames and self.level > 0:
+            self.level -= 1
+            self._clean = 0
+        return self.level
+
+
+class DetectionScheduler:
+    def __init__(self, workers=1):
+        """Share a fixed number of detection threads across every live camera
+
+        A free thread picks, among cameras that have a new frame and are due
+        under their target FPS, the one with the highest priority and then the
+        longest overdue. Cameras that cannot be served in time simply skip
+        frames; nothing queues up.
+
+        Args:
+            workers: Number of detection threads (concurrent detector calls)
+        """
+        self._cond = threading.Condition()
+        self._pipelines = []
+        self._threads = []
+        for _ in range(workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def add(self, pipeline):
+        with self._cond:
+            self._pipelines.append(pipeline)
+            self._cond.notify_all()
+
+    def remove(self, pipeline):
+        with self._cond:
+            if pipeline in self._pipelines:
+                self._pipelines.remove(pipeline)
+
+    def wake(self):
+        """Signal that a camera has captured a new frame"""
+        with self._cond:
+            self._cond.notify()
+
+    def _next(self):
+        """Pick the camera to serve now, or how long to wait (called under the lock)"""
+        now = time.time()
+        best = None
+        wait = None
+        for pipeline in self._pipelines:
+            if pipeline.busy or not pipeline.has_new_frame():
+                continue
+            if pipeline.next_due > now:
+                delay = pipeline.next_due - now
+                wait = delay if wait is None else min(wait, delay)
+                continue
+            if best is None or (-pipeline.priority, pipeline.next_due) < (-best.priority, best.next_due):
+                best = pipeline
+        return best, wait
+
+    def _work(self):
+        while True:
+            with self._cond:
+                pipeline, wait = self._next()
+                while pipeline is None:
+                    self._cond.wait(wait)
+                    pipeline, wait = self._next()
+                pipeline.busy = True
+            try:
+                pipeline.detect_latest()
+            finally:
+                with self._cond:
+                    pipeline.busy = False
+                    self._cond.notify()
+
+
+class CameraRegistry:
+    def __init__(self, cameras, factory):
+        """Running LivePipelines for the configured cameras
+
+        A camera starts with its first viewer and stops when the last one
+        leaves, unless it is monitored (kept running for its stats). Viewers
+        read the pipeline's encoded frames independently, so a slow client only
+        skips frames and never holds up capture or detection.
+
+        Starting and stopping a camera is serialized per camera, so a camera
+        that is slow to open or release never holds up the others.
+
+        Args:
+            cameras: Dict of camera ID -> camera config
+            factory: Called with (camera ID, config); returns an unstarted LivePipeline
+        """
+        self.cameras = cameras
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._running = {}  # camera ID -> {'pipeline', 'viewers', 'monitored'}
+        self._camera_locks = {}  # camera ID -> lock held while it starts or stops
+
+    def _camera_lock(self, camera_id):
+        with self._lock:
+            return self._camera_locks.setdefault(camera_id, threading.Lock())
+
+    def _acquire(self, camera_id):
+        """Running entry for a camera, starting it if needed
+
+        Called under the camera's lock and self._lock; LivePipeline.start()
+        does not wait for the camera to open.
+        """
+        entry = self._running.get(camera_id)
+        if entry is None or entry['pipeline'].closed:
+            # Not running yet, or the previous capture ended (e.g. stream lost)
+            entry = {'pipeline': self.factory(camera_id, self.cameras[camera_id]).start(),
+                     'viewers': 0, 'monitored': False}
+            self._running[camera_id] = entry
+        return entry
+
+    def _detach_if_idle(self, camera_id, entry):
+        """Remove an entry nobody uses (called under self._lock)
+
+        Returns:
+            True if the caller should stop the entry's pipeline
+        """
+        if entry['viewers'] > 0 or entry['monitored']:
+            return False
+        if self._running.get(camera_id) is entry:
+            del self._running[camera_id]
+        return True
+
+    @contextmanager
+    def subscribe(self, camera_id):
+        """Context manager yielding the running pipeline for a camera
+
+        Raises KeyError for an unknown camera ID
+        """
+        if camera_id not in self.cameras:
+            raise KeyError(camera_id)
+        camera_lock = self._camera_lock(camera_id)
+        with camera_lock, self._lock:
+            entry = self._acquire(camera_id)
+            entry['viewers'] += 1
+        try:
+            yield entry['pipeline']
+        finally:
+            # Stopped under the camera's lock only, so a new viewer cannot open
+            # the same device before this pipeline has released it while every
+            # other camera carries on
+            with camera_lock:
+                with self._lock:
+                    entry['viewers'] -= 1
+                    idle = self._detach_if_idle(camera_id, entry)
+                if idle:
+                    entry['pipeline'].stop()
+
+    def start_monitoring(self):
+        """Start every camera configured with monitor=True"""
+        for camera_id, config in self.cameras.items():
+            if config.get('monitor'):
+                with self._camera_lock(camera_id), self._lock:
+                    self._acquire(camera_id)['monitored'] = True
+
+    def stop_all(self):
+        with self._lock:
+            entries = list(self._running.values())
+            self._running.clear()
+        for entry in entries:
+            entry['pipeline'].stop()
+
+    def status(self):
+        """{'running': bool, 'viewers': int} per camera"""
+        with self._lock:
+            status = {}
+            for camera_id in self.cameras:
+                entry = self._running.get(camera_id)
+                running = entry is not None and not entry['pipeline'].closed
+                status[camera_id] = {'running': running,
+                                     'viewers': entry['viewers'] if entry else 0}
+            return status
+
+
+class StatsBroadcaster:
+    def __init__(self, snapshot, keys, min_interval=0.25):
+        """Single fan-out point for pushed stats updates
+
+        notify() only flags a change. One background thread coalesces flagged
+        changes into at most one snapshot per min_interval, and publishes each
+        key's serialized payload to its channel only when it differs from the
+        last one sent. Subscribers read a channel like any LatestValue.
+
+        Args:
+            snapshot: Returns {key: serialized payload} for every key
+            keys: Keys to create channels for (e.g. camera IDs)
+            min_interval: Minimum seconds between published updates
+        """
+        self.snapshot = snapshot
+        self.min_interval = min_interval
+        self.channels = {key: LatestValue() for key in keys}
+        self._changed = threading.Event()
+        self._last = {}
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def notify(self):
+        self._changed.set()
+
+    def _run(self):
+        while True:
+            self._changed.wait()
+            self._changed.clear()
+            try:
+                payloads = self.snapshot()
+            except Exception as e:
+                print(f"⚠ Stats snapshot failed: {e}")
+                payloads = {}
+            for key, payload in payloads.items():
+                if key in self.channels and payload != self._last.get(key):
+                    self._last[key] = payload
+                    self.channels[key].put(payload)
+            time.sleep(self.min_interval)
@@ -0,0 +1,51 @@
+"""
+Motion gate for the live camera feed
+Compares a downscaled grayscale copy of each frame with the last frame that
+was let through, so static scenes (night, red phases) skip inference
+"""
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    def __init__(self, threshold=0.01, pixel_threshold=25, width=160, max_skipped=50):
+        """
+        Args:
+            threshold: Fraction of pixels that must change to count as motion
+            pixel_threshold: Gray-level difference for a pixel to count as changed
+            width: Width the frame is downscaled to before comparing
+            max_skipped: Force a detection after this many skipped frames in a
+                         row, so slow changes (lighting, parked vehicles) are picked up
+        """
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.width = width
+        self.max_skipped = max_skipped
+
+        self.frames = 0
+        self.skipped = 0
+        self._reference = None
+        self._skipped_in_row = 0
+
+    @property
+    def skipped_ratio(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def changed(self, frame):
+        """Whether the frame differs enough from the last one let through to be processed"""
+        H, W = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, H * self.width // W)), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        self.frames += 1
+
+        if (self._reference is not None and self._reference.shape == gray.shape
+                and self._skipped_in_row < self.max_skipped):
+            diff = cv2.absdiff(gray, self._reference)
+            if np.count_nonzero(diff > self.pixel_threshold) < self.threshold * diff.size:
+                self.skipped += 1
+                self._skipped_in_row += 1
+                return False
+
+        self._reference = gray
+        self._skipped_in_row = 0
+        return True
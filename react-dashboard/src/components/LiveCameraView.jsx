@@ -13,6 +13,8 @@ export default function LiveCameraView() {
     });
 
     useEffect(() => {
+        let interval = null;
+
         const fetchStats = async () => {
             try {
                 const response = await fetch('/stats');
@@ -23,10 +25,22 @@ export default function LiveCameraView() {
             }
         };
 
-        fetchStats();
-        const interval = setInterval(fetchStats, 1000);
+        // Stats are pushed as they change; fall back to polling /stats if
+        // the browser or a proxy cannot keep the stream open
+        const source = new EventSource('/stats/stream');
+        source.onmessage = (event) => setStats(JSON.parse(event.data));
+        source.onerror = () => {
+            source.close();
+            if (!interval) {
+                fetchStats();
+                interval = setInterval(fetchStats, 1000);
+            }
+        };
 
-        return () => clearInterval(interval);
+        return () => {
+            source.close();
+            if (interval) clearInterval(interval);
+        };
     }, []);
 
     return (
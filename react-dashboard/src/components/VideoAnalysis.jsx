@@ -1,11 +1,15 @@
-import { useState } from 'react';
+import { useState, useRef } from 'react';
 import TrafficSignalLoader from './TrafficSignalLoader';
 
+const POLL_INTERVAL = 1000;
+
 export default function VideoAnalysis() {
     const [selectedFile, setSelectedFile] = useState(null);
     const [processing, setProcessing] = useState(false);
     const [results, setResults] = useState(null);
     const [error, setError] = useState(null);
+    const [job, setJob] = useState(null);
+    const cancelled = useRef(false);
 
     const handleFileSelect = (e) => {
         const file = e.target.files[0];
@@ -23,6 +27,8 @@ export default function VideoAnalysis() {
 
         setProcessing(true);
         setError(null);
+        setJob(null);
+        cancelled.current = false;
 
         const formData = new FormData();
         formData.append('video', selectedFile);
@@ -35,10 +41,25 @@ export default function VideoAnalysis() {
 
             const data = await response.json();
 
-            if (data.success) {
-                setResults(data);
-            } else {
+            if (!data.success) {
                 setError(data.error || 'An error occurred');
+                return;
+            }
+
+            // Analysis runs as a background job; poll it until it finishes
+            while (!cancelled.current) {
+                await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL));
+                const status = await (await fetch(`/api/video-jobs/${data.job_id}`)).json();
+                setJob(status);
+
+                if (status.status === 'done') {
+                    setResults(status.result);
+                    break;
+                }
+                if (status.status === 'failed' || status.status === 'cancelled' || !status.success) {
+                    setError(status.error || `Video analysis ${status.status || 'failed'}`);
+                    break;
+                }
             }
         } catch (err) {
             setError('Failed to analyze video: ' + err.message);
@@ -47,10 +68,19 @@ export default function VideoAnalysis() {
         }
     };
 
+    const handleCancel = async () => {
+        cancelled.current = true;
+        if (job) {
+            await fetch(`/api/video-jobs/${job.job_id}/cancel`, { method: 'POST' });
+        }
+        setError('Video analysis cancelled');
+    };
+
     const handleReset = () => {
         setSelectedFile(null);
         setResults(null);
         setError(null);
+        setJob(null);
     };
 
     if (results) {
@@ -175,10 +205,19 @@ export default function VideoAnalysis() {
             </div>
 
             {processing && (
-                <TrafficSignalLoader
-                    message="Processing video..."
-                    description="Analyzing frames with YOLO AI model - This may take a few moments"
-                />
+                <>
+                    <TrafficSignalLoader
+                        message={job ? `Processing video... ${job.progress}%` : 'Uploading video...'}
+                        description={job
+                            ? `${job.processed_frames} frames analyzed - peak ${job.partial.total_vehicles} vehicles so far`
+                            : 'Analyzing frames with YOLO AI model - This may take a few moments'}
+                    />
+                    <div style={{ textAlign: 'center', marginTop: 'var(--spacing-md)' }}>
+                        <button className="control-btn" onClick={handleCancel}>
+                            Cancel
+                        </button>
+                    </div>
+                </>
             )}
 
             {error && (
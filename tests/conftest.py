@@ -0,0 +1,22 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+# The backend modules live at the repository root, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+NUMBERED_FRAMES = 90
+
+
+@pytest.fixture(scope='session')
+def numbered_video(tmp_path_factory):
+    """A 10 fps video of NUMBERED_FRAMES frames; frame n is filled with grey level 2 * n"""
+    path = str(tmp_path_factory.mktemp('video') / 'numbered.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (32, 24))
+    for n in range(NUMBERED_FRAMES):
+        writer.write(np.full((24, 32, 3), 2 * n, dtype=np.uint8))
+    writer.release()
+    return path
@@ -0,0 +1,336 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from detector import (DetectorBusyError, DetectorPool, DetectorSession, Detections,
+                      MicroBatcher, ModelRegistry, TierController, box_iou)
+
+LABELS = ['person', 'car', 'truck']
+
+
+class FakeSession:
+    """Stands in for a DetectorSession; detect returns what it was called with"""
+
+    def __init__(self):
+        self.broken = False
+        self.closed = False
+
+    def detect(self, frame, confidence=None, threshold=None, input_size=None):
+        return frame, input_size
+
+    def detect_batch(self, frames, confidence=None, threshold=None, input_size=None):
+        return [(frame, input_size) for frame in frames]
+
+    def close(self):
+        self.closed = True
+
+
+def session(model_format='yolov3', input_size=416):
+    """A DetectorSession without a net; decode only needs the format and class mask"""
+    detector = DetectorSession.__new__(DetectorSession)
+    detector.model_format = model_format
+    detector.input_size = input_size
+    detector.vehicle_class_mask = np.array([label in ('car', 'truck') for label in LABELS])
+    return detector
+
+
+def test_decode_yolov3_rows_across_layers():
+    # [centerX, centerY, width, height, objectness, person, car, truck], relative to the frame
+    layer_a = np.array([[0.5, 0.5, 0.2, 0.4, 1.0, 0.0, 0.9, 0.1],
+                        [0.5, 0.5, 0.2, 0.4, 1.0, 0.95, 0.0, 0.0]], dtype=np.float32)
+    layer_b = np.array([[0.25, 0.75, 0.1, 0.1, 1.0, 0.0, 0.1, 0.7],
+                        [0.25, 0.75, 0.1, 0.1, 1.0, 0.0, 0.3, 0.2]], dtype=np.float32)
+
+    boxes, confidences, class_ids = session().decode([layer_a, layer_b], 100, 200, 0.5)
+
+    # The person row and the row under the confidence threshold are dropped
+    assert boxes.tolist() == [[40, 60, 20, 80], [20, 140, 10, 20]]
+    assert np.allclose(confidences, [0.9, 0.7])
+    assert class_ids.tolist() == [1, 2]
+
+
+def test_decode_yolov8_scales_from_input_pixels():
+    # (1, 4 + classes, anchors): boxes in network input pixels, no objectness column
+    output = np.array([[[160, 10],
+                        [160, 10],
+                        [32, 4],
+                        [64, 4],
+                        [0.1, 0.0],
+                        [0.2, 0.1],
+                        [0.8, 0.2]]], dtype=np.float32)
+
+    boxes, confidences, class_ids = session('yolov8').decode([output], 640, 320, 0.5, input_size=320)
+
+    assert boxes.tolist() == [[288, 128, 64, 64]]
+    assert np.allclose(confidences, [0.8])
+    assert class_ids.tolist() == [2]
+
+
+def test_decode_without_candidates_returns_empty_arrays():
+    layer = np.zeros((3, 8), dtype=np.float32)
+    boxes, confidences, class_ids = session().decode([layer], 100, 100, 0.5)
+    assert boxes.shape == (0, 4)
+    assert len(confidences) == len(class_ids) == 0
+
+
+def test_pool_runs_on_its_sessions():
+    pool = DetectorPool(FakeSession, size=2)
+    assert len(pool.sessions) == 2
+    assert pool.detect('frame', input_size=320) == ('frame', 320)
+    assert pool.detect_batch(['a', 'b']) == [('a', None), ('b', None)]
+
+
+def test_pool_rejects_callers_beyond_max_waiting_at_once():
+    pool = DetectorPool(FakeSession, size=1, max_waiting=0)
+    with pool.session():
+        start = time.monotonic()
+        with pytest.raises(DetectorBusyError):
+            with pool.session():
+                pass
+        assert time.monotonic() - start < 0.5
+    # The slot is free again once the holder is done
+    with pool.session():
+        pass
+
+
+def test_pool_times_out_waiting_callers():
+    pool = DetectorPool(FakeSession, size=1, max_waiting=1, timeout=0.05)
+    with pool.session():
+        with pytest.raises(DetectorBusyError):
+            with pool.session():
+                pass
+
+
+def test_pool_hands_a_released_session_to_a_waiting_caller():
+    pool = DetectorPool(FakeSession, size=1, max_waiting=1, timeout=5)
+    released = threading.Event()
+
+    def hold():
+        with pool.session():
+            released.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    time.sleep(0.05)
+    threading.Timer(0.05, released.set).start()
+    assert pool.detect('frame') == ('frame', None)
+    holder.join(5)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_pool_restarts_a_broken_session():
+    pool = DetectorPool(FakeSession, size=1, timeout=5)
+    with pool.session() as broken:
+        broken.broken = True
+
+    # The next caller waits for the replacement instead of getting the dead session
+    with pool.session() as replacement:
+        assert replacement is not broken
+    assert broken.closed
+    assert pool.sessions == [replacement]
+
+
+def test_pool_drops_a_session_that_cannot_restart():
+    sessions = iter([FakeSession()])
+
+    def factory():
+        session = next(sessions, None)
+        if session is None:
+            raise RuntimeError("worker failed to start")
+        return session
+
+    pool = DetectorPool(factory, size=1)
+    with pool.session() as broken:
+        broken.broken = True
+    wait_until(lambda: pool.sessions == [])
+
+
+class RecordingPool:
+    """Pool stand-in for MicroBatcher that records each batch and can be held"""
+    size = 1
+
+    def __init__(self):
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def detect_batch(self, frames, confidence=None, threshold=None, input_size=None):
+        self.release.wait(5)
+        self.batches.append((list(frames), input_size))
+        if 'bad' in frames:
+            raise RuntimeError("forward failed")
+        return [(frame, input_size) for frame in frames]
+
+
+def test_batcher_merges_concurrent_frames():
+    pool = RecordingPool()
+    batcher = MicroBatcher(pool, max_batch_size=8, max_wait=0.2)
+    futures = [batcher.submit(n) for n in range(3)]
+    assert [future.result(5) for future in futures] == [(0, None), (1, None), (2, None)]
+    assert pool.batches == [([0, 1, 2], None)]
+
+
+def test_batcher_splits_batches_by_settings():
+    pool = RecordingPool()
+    batcher = MicroBatcher(pool, max_batch_size=8, max_wait=0.2)
+    futures = [batcher.submit('a', input_size=320), batcher.submit('b', input_size=608),
+               batcher.submit('c', input_size=320)]
+    assert [future.result(5) for future in futures] == [('a', 320), ('b', 608), ('c', 320)]
+    assert sorted(pool.batches) == [(['a', 'c'], 320), (['b'], 608)]
+
+
+def test_batcher_rejects_at_once_when_the_queue_is_full():
+    pool = RecordingPool()
+    pool.release.clear()
+    batcher = MicroBatcher(pool, max_batch_size=1, max_waiting=1, timeout=5)
+    running = batcher.submit('running')
+    wait_until(lambda: batcher._pending.empty())
+    queued = batcher.submit('queued')
+
+    start = time.monotonic()
+    with pytest.raises(DetectorBusyError):
+        batcher.submit('rejected')
+    assert time.monotonic() - start < 0.5
+
+    pool.release.set()
+    assert running.result(5) == ('running', None)
+    assert queued.result(5) == ('queued', None)
+
+
+def test_batcher_times_out_waiting_for_a_result():
+    pool = RecordingPool()
+    pool.release.clear()
+    batcher = MicroBatcher(pool, timeout=0.05)
+    with pytest.raises(DetectorBusyError):
+        batcher.detect('frame')
+    pool.release.set()
+
+
+def test_batcher_fails_every_frame_of_a_failed_batch():
+    pool = RecordingPool()
+    batcher = MicroBatcher(pool, max_batch_size=8, max_wait=0.2)
+    futures = [batcher.submit('bad'), batcher.submit('good')]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(5)
+
+
+def test_tier_controller_steps_down_and_back_up():
+    controller = TierController(['large', 'medium', 'small'], target_latency=1.0, smoothing=1.0, cooldown=0)
+    controller.record(2.0)
+    assert controller.select('large') == 'medium'
+    controller.record(2.0)
+    controller.record(2.0)
+    assert controller.select('large') == 'small'
+
+    # Recovers only once latency is well under target
+    controller.record(0.8)
+    assert controller.select('large') == 'small'
+    controller.record(0.3)
+    assert controller.select('large') == 'medium'
+
+
+def test_tier_controller_never_picks_a_more_expensive_tier():
+    controller = TierController(['large', 'small'], target_latency=1.0, cooldown=0)
+    assert controller.select('small') == 'small'
+    assert controller.select('custom') == 'custom'
+
+
+def test_tier_controller_waits_for_the_cooldown():
+    controller = TierController(['large', 'medium', 'small'], target_latency=1.0, smoothing=1.0, cooldown=60)
+    controller.record(5.0)
+    assert controller.level == 0
+
+
+def test_registry_shares_one_detector_between_input_sizes(tmp_path):
+    cfg, weights = tmp_path / 'yolov3.cfg', tmp_path / 'yolov3.weights'
+    cfg.write_text('')
+    weights.write_text('')
+    model = {'config_path': str(cfg), 'weights_path': str(weights)}
+    built = []
+
+    def build(name, settings):
+        built.append(name)
+        return DetectorPool(FakeSession, size=1)
+
+    registry = ModelRegistry({'yolov3-608': dict(model, input_size=608),
+                              'yolov3-320': dict(model, input_size=320),
+                              'missing': {'config_path': str(tmp_path / 'x.cfg'),
+                                          'weights_path': str(weights), 'input_size': 416}},
+                             build)
+    assert registry.available() == ['yolov3-608', 'yolov3-320']
+    assert registry.loaded() == []
+
+    assert registry.get('yolov3-608').detect('frame') == ('frame', 608)
+    assert registry.get('yolov3-320').detect('frame') == ('frame', 320)
+    assert built == ['yolov3-608']
+    assert registry.loaded() == ['yolov3-608', 'yolov3-320']
+
+    with pytest.raises(ValueError):
+        registry.get('missing')
+
+
+def test_box_iou_pairwise_matrix():
+    boxes_a = [[0, 0, 10, 10], [20, 20, 10, 10]]
+    boxes_b = [[0, 0, 10, 10], [5, 0, 10, 10], [100, 100, 5, 5]]
+    iou = box_iou(boxes_a, boxes_b)
+    assert iou.shape == (2, 3)
+    # Identical, half-overlapping (50 / 150) and disjoint boxes
+    assert np.allclose(iou[0], [1.0, 1 / 3, 0.0])
+    assert np.allclose(iou[1], 0.0)
+
+
+def test_box_iou_matches_the_pairwise_formula():
+    rng = np.random.default_rng(0)
+    boxes_a = np.column_stack([rng.integers(0, 50, (6, 2)), rng.integers(1, 30, (6, 2))])
+    boxes_b = np.column_stack([rng.integers(0, 50, (4, 2)), rng.integers(1, 30, (4, 2))])
+
+    def iou(a, b):
+        width = max(0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+        height = max(0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+        intersection = width * height
+        return intersection / (a[2] * a[3] + b[2] * b[3] - intersection)
+
+    expected = [[iou(a, b) for b in boxes_b] for a in boxes_a]
+    assert np.allclose(box_iou(boxes_a, boxes_b), expected)
+
+
+def test_box_iou_empty_and_degenerate_boxes():
+    assert box_iou([], [[0, 0, 10, 10]]).shape == (0, 1)
+    assert box_iou([[0, 0, 0, 0]], [[0, 0, 0, 0]]).tolist() == [[0.0]]
+
+
+def test_detections_from_xyxy_keeps_the_requested_classes():
+    data = [[10, 20, 50, 80, 0.9, 1],
+            [0, 0, 5, 5, 0.8, 0],
+            [30, 30, 40, 60, 0.6, 2]]
+    detections = Detections.from_xyxy(data, LABELS, class_ids=[1, 2])
+    assert len(detections) == 2
+    assert detections.boxes.tolist() == [[10, 20, 40, 60], [30, 30, 10, 30]]
+    assert detections.class_ids.tolist() == [1, 2]
+    assert len(Detections.from_xyxy(np.empty((0, 6)), LABELS)) == 0
+
+
+def test_detections_select_shift_and_breakdown():
+    detections = Detections([[0, 0, 10, 10], [5, 5, 10, 10], [8, 8, 2, 2]], [0.9, 0.8, 0.7], [1, 2, 1],
+                            LABELS)
+    cars = detections.select(detections.class_ids == 1)
+    assert cars.boxes.tolist() == [[0, 0, 10, 10], [8, 8, 2, 2]]
+    assert cars.labels is LABELS
+
+    assert cars.shifted(100, 50).boxes.tolist() == [[100, 50, 10, 10], [108, 58, 2, 2]]
+    assert detections.breakdown() == {'car': 2, 'truck': 1}
+    assert Detections([], [], [], LABELS).breakdown() == {}
+
+
+def test_detections_to_json():
+    detections = Detections([[1, 2, 3, 4]], [0.97213], [2], LABELS)
+    assert detections.to_json() == [{'type': 'truck', 'confidence': '97.21%', 'bbox': [1, 2, 3, 4]}]
@@ -0,0 +1,57 @@
+import time
+
+from emergency_watch import EmergencyWatch
+
+HIT = ['ambulance']
+MISS = []
+
+
+def test_due_at_the_interval_or_sooner_for_new_vehicles():
+    watch = EmergencyWatch(interval=1.0, min_interval=0.25)
+    assert watch.due()
+    watch.record(MISS)
+    assert not watch.due()
+    assert not watch.due(new_vehicles=True)
+
+    watch._last_run = time.time() - 0.3
+    assert not watch.due()
+    assert watch.due(new_vehicles=True)
+    watch._last_run = time.time() - 1.0
+    assert watch.due()
+
+
+def test_confirms_after_enough_hits_in_the_window():
+    watch = EmergencyWatch(confirm_hits=3, window=5)
+    assert [watch.record(hits) for hits in (HIT, MISS, HIT)] == [None, None, None]
+    assert watch.record(HIT) == 'confirmed'
+    assert watch.active and watch.since is not None
+    # Further hits do not confirm again
+    assert watch.record(HIT) is None
+
+
+def test_clears_after_a_whole_window_without_hits():
+    watch = EmergencyWatch(confirm_hits=2, window=3)
+    watch.record(HIT)
+    watch.record(HIT)
+    assert [watch.record(MISS) for _ in range(3)] == [None, None, 'cleared']
+    assert not watch.active and watch.since is None
+
+
+def test_keeps_the_last_hit_while_active():
+    watch = EmergencyWatch(confirm_hits=2, window=3)
+    watch.record(['first'])
+    watch.record(['second'])
+    watch.record(MISS)
+    watch.record(MISS)
+    assert watch.active
+    assert watch.detections == ['second']
+
+    assert watch.record(MISS) == 'cleared'
+    assert watch.detections == MISS
+
+
+def test_misses_are_kept_while_inactive():
+    watch = EmergencyWatch(confirm_hits=3)
+    watch.record(HIT)
+    watch.record(MISS)
+    assert watch.detections == MISS
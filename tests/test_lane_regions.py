@@ -0,0 +1,49 @@
+import numpy as np
+
+from lane_regions import LaneRegions, points_in_polygon
+
+SQUARE = [[0, 0], [10, 0], [10, 10], [0, 10]]
+
+
+def test_points_inside_and_outside():
+    inside = points_in_polygon([[5, 5], [1, 9], [15, 5], [-1, 5], [5, 11]], SQUARE)
+    assert inside.tolist() == [True, True, False, False, False]
+
+
+def test_concave_polygon():
+    # U shape: the notch between the arms is outside
+    u_shape = [[0, 0], [10, 0], [10, 10], [7, 10], [7, 3], [3, 3], [3, 10], [0, 10]]
+    inside = points_in_polygon([[1, 8], [9, 8], [5, 8], [5, 1]], u_shape)
+    assert inside.tolist() == [True, True, False, True]
+
+
+def test_ray_through_vertex_counts_once():
+    diamond = [[5, 0], [10, 5], [5, 10], [0, 5]]
+    # The horizontal ray from these points passes exactly through a vertex
+    inside = points_in_polygon([[2, 5], [-2, 5], [5, 5]], diamond)
+    assert inside.tolist() == [True, False, True]
+
+
+def test_horizontal_edges_and_empty_input():
+    assert points_in_polygon([[5, 0.5]], SQUARE).tolist() == [True]
+    assert points_in_polygon(np.empty((0, 2)), SQUARE).shape == (0,)
+
+
+def test_degenerate_polygon_contains_nothing():
+    assert points_in_polygon([[5, 0], [5, 5]], [[0, 0], [10, 0]]).tolist() == [False, False]
+
+
+def test_lanes_assign_by_bottom_centre():
+    lanes = LaneRegions({'left': [[0, 0], [50, 0], [50, 100], [0, 100]],
+                         'right': [[50, 0], [100, 0], [100, 100], [50, 100]]})
+    # Bottom centres: (20, 90) left, (80, 60) right, (120, 50) outside
+    assigned = lanes.assign([[10, 70, 20, 20], [70, 20, 20, 40], [110, 0, 20, 50]])
+    assert assigned.tolist() == [0, 1, -1]
+    assert lanes.counts(assigned) == {'left': 1, 'right': 1}
+
+
+def test_crop_is_clamped_to_the_frame():
+    lanes = LaneRegions({'lane': [[-10, 20], [300, 20], [300, 80], [-10, 80]]})
+    crop, offset = lanes.crop(np.zeros((100, 200, 3), dtype=np.uint8))
+    assert offset == (0, 20)
+    assert crop.shape[:2] == (61, 200)
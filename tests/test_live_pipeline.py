@@ -0,0 +1,184 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from live_pipeline import (CameraRegistry, DetectionScheduler, LatestValue, LivePipeline,
+                           StreamAdapter)
+
+
+def test_latest_value_skips_values_nobody_read():
+    slot = LatestValue()
+    slot.put('a')
+    slot.put('b')
+    value, seq = slot.get()
+    assert (value, seq) == ('b', 2)
+    # Nothing newer yet
+    assert slot.get(seq, timeout=0.01) == (None, 2)
+
+
+def test_latest_value_wakes_a_waiting_reader():
+    slot = LatestValue()
+    threading.Timer(0.05, slot.put, ('frame',)).start()
+    assert slot.get(timeout=5) == ('frame', 1)
+
+
+def test_latest_value_close_wakes_readers_for_good():
+    slot = LatestValue()
+    slot.put('frame')
+    threading.Timer(0.05, slot.close).start()
+    assert slot.get(1, timeout=5) == (None, 1)
+    assert slot.closed
+    assert slot.get() == (None, 0)
+
+
+class FakeCamera:
+    """Pipeline stand-in for the scheduler and the registry"""
+
+    def __init__(self, camera_id, priority=0, next_due=0.0, stop_delay=0.0):
+        self.camera_id = camera_id
+        self.priority = priority
+        self.next_due = next_due
+        self.busy = False
+        self.closed = False
+        self.started = False
+        self.stop_delay = stop_delay
+
+    def has_new_frame(self):
+        return True
+
+    def start(self):
+        self.started = True
+        return self
+
+    def stop(self):
+        time.sleep(self.stop_delay)
+        self.closed = True
+
+
+def fake_factory(camera_id, config):
+    return FakeCamera(camera_id, stop_delay=config.get('stop_delay', 0.0))
+
+
+def test_scheduler_serves_priority_then_the_longest_overdue():
+    scheduler = DetectionScheduler(workers=0)
+    now = time.time()
+    low = FakeCamera('low', priority=0, next_due=now - 5)
+    late = FakeCamera('late', priority=1, next_due=now - 2)
+    recent = FakeCamera('recent', priority=1, next_due=now - 1)
+    for camera in (low, recent, late):
+        scheduler.add(camera)
+
+    assert scheduler._next()[0] is late
+    late.busy = True
+    assert scheduler._next()[0] is recent
+    recent.busy = True
+    assert scheduler._next()[0] is low
+
+
+def test_scheduler_waits_for_the_next_due_camera():
+    scheduler = DetectionScheduler(workers=0)
+    scheduler.add(FakeCamera('soon', next_due=time.time() + 0.5))
+    scheduler.add(FakeCamera('later', next_due=time.time() + 2))
+    camera, wait = scheduler._next()
+    assert camera is None
+    assert 0 < wait <= 0.5
+
+
+def test_registry_shares_a_camera_and_stops_it_with_the_last_viewer():
+    registry = CameraRegistry({'a': {}}, fake_factory)
+    with registry.subscribe('a') as first:
+        with registry.subscribe('a') as second:
+            assert first is second and first.started
+            assert registry.status() == {'a': {'running': True, 'viewers': 2}}
+        assert not first.closed
+    assert first.closed
+    assert registry.status() == {'a': {'running': False, 'viewers': 0}}
+
+
+def test_registry_keeps_monitored_cameras_running():
+    registry = CameraRegistry({'a': {'monitor': True}, 'b': {}}, fake_factory)
+    registry.start_monitoring()
+    with registry.subscribe('a'):
+        pass
+    assert registry.status() == {'a': {'running': True, 'viewers': 0},
+                                 'b': {'running': False, 'viewers': 0}}
+    registry.stop_all()
+    assert registry.status()['a']['running'] is False
+
+
+def test_registry_slow_stop_does_not_block_other_cameras():
+    registry = CameraRegistry({'slow': {'stop_delay': 1.0}, 'fast': {}}, fake_factory)
+
+    def watch_slow():
+        with registry.subscribe('slow'):
+            pass
+
+    viewer = threading.Thread(target=watch_slow)
+    viewer.start()
+    time.sleep(0.1)  # The slow camera is now stopping
+
+    start = time.monotonic()
+    registry.status()
+    with registry.subscribe('fast'):
+        pass
+    assert time.monotonic() - start < 0.5
+    viewer.join(5)
+
+
+def test_pipeline_captures_detects_and_encodes(numbered_video):
+    scheduler = DetectionScheduler(workers=1)
+    processed = []
+
+    def process(frame):
+        processed.append(frame)
+        return frame
+
+    pipeline = LivePipeline(numbered_video, process, scheduler, fps=100, loop=True).start()
+    slot = pipeline.acquire_encoding(80)
+    try:
+        jpeg, _ = slot.get(timeout=5)
+        assert jpeg is not None
+        assert cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR).shape == (24, 32, 3)
+    finally:
+        pipeline.release_encoding(80)
+        pipeline.stop()
+    assert processed
+    assert pipeline.closed
+
+
+def test_stream_adapter_drops_a_level_when_frames_are_skipped():
+    adapter = StreamAdapter(levels=3, drop_threshold=0.3)
+    assert adapter.record(0) == 0
+    # One skip moves the smoothed drop rate to 0.2, a second one past 0.3
+    assert adapter.record(2) == 0
+    assert adapter.record(1) == 1
+    for _ in range(10):
+        adapter.record(1)
+    assert adapter.level == 2
+
+
+def test_stream_adapter_recovers_after_clean_frames():
+    adapter = StreamAdapter(levels=3, level=2, recover_frames=5)
+    assert [adapter.record(0) for _ in range(5)] == [2, 2, 2, 2, 1]
+    assert [adapter.record(0) for _ in range(5)] == [1, 1, 1, 1, 0]
+    assert adapter.record(0) == 0
+
+
+def test_pipeline_encodes_each_quality_and_scale_in_use(numbered_video):
+    pipeline = LivePipeline(numbered_video, lambda frame: frame, DetectionScheduler(workers=1),
+                            fps=100, loop=True).start()
+    full = pipeline.acquire_encoding(90)
+    half = pipeline.acquire_encoding(50, scale=0.5)
+    shared = pipeline.acquire_encoding(90)
+    try:
+        assert shared is full
+        shapes = [cv2.imdecode(np.frombuffer(slot.get(timeout=5)[0], np.uint8), cv2.IMREAD_COLOR).shape
+                  for slot in (full, half)]
+        assert shapes == [(24, 32, 3), (12, 16, 3)]
+    finally:
+        for quality, scale in ((90, 1.0), (50, 0.5), (90, 1.0)):
+            pipeline.release_encoding(quality, scale)
+        pipeline.stop()
+    assert pipeline._encodings == {}
@@ -0,0 +1,50 @@
+import numpy as np
+
+from motion_gate import MotionGate
+
+
+def scene(block_at=None):
+    """A grey 320x240 frame, optionally with a white 60x60 block at (x, y)"""
+    frame = np.full((240, 320, 3), 100, dtype=np.uint8)
+    if block_at is not None:
+        x, y = block_at
+        frame[y:y + 60, x:x + 60] = 255
+    return frame
+
+
+def test_first_frame_and_motion_pass_static_frames_skip():
+    gate = MotionGate()
+    assert gate.changed(scene())
+    assert not gate.changed(scene())
+    assert gate.changed(scene((100, 100)))
+    assert not gate.changed(scene((100, 100)))
+    assert gate.skipped_ratio == 0.5
+
+
+def test_sensor_noise_is_not_motion():
+    gate = MotionGate()
+    gate.changed(scene())
+    noise = np.random.default_rng(0).integers(-5, 6, (240, 320, 3))
+    assert not gate.changed((scene() + noise).astype(np.uint8))
+
+
+def test_compares_against_the_last_frame_let_through():
+    # A slow drift is measured from the reference frame, not the previous frame
+    gate = MotionGate(pixel_threshold=25)
+    gate.changed(scene())
+    for level in (110, 120):
+        assert not gate.changed(np.full((240, 320, 3), level, dtype=np.uint8))
+    assert gate.changed(np.full((240, 320, 3), 130, dtype=np.uint8))
+
+
+def test_forces_a_detection_after_max_skipped():
+    gate = MotionGate(max_skipped=3)
+    gate.changed(scene())
+    assert [gate.changed(scene()) for _ in range(4)] == [False, False, False, True]
+    assert not gate.changed(scene())
+
+
+def test_resolution_change_is_treated_as_motion():
+    gate = MotionGate()
+    gate.changed(scene())
+    assert gate.changed(np.full((480, 320, 3), 100, dtype=np.uint8))
@@ -0,0 +1,75 @@
+from detector import Detections
+from tracker import VehicleTracker
+
+LABELS = ['car', 'truck']
+
+
+def detections(*boxes, class_id=0):
+    return Detections(list(boxes), [0.9] * len(boxes), [class_id] * len(boxes), LABELS)
+
+
+def test_ids_persist_across_moving_detections():
+    tracker = VehicleTracker(detect_every=1)
+    tracker.update(detections([0, 0, 50, 50], [200, 0, 50, 50]))
+    first_ids = tracker.ids.tolist()
+
+    tracker.update(detections([205, 2, 50, 50], [5, 2, 50, 50]))
+
+    # Same vehicles, listed in the other order, keep their IDs
+    by_x = dict(zip(tracker.boxes[:, 0].tolist(), tracker.ids.tolist()))
+    assert by_x[5] == first_ids[0]
+    assert by_x[205] == first_ids[1]
+    assert tracker.unique_total == 2
+    assert tracker.unique_breakdown == {'car': 2}
+
+
+def test_fast_vehicle_matches_by_centroid():
+    tracker = VehicleTracker(detect_every=1)
+    tracker.update(detections([0, 0, 40, 40]))
+    # No overlap with the old box, but the centre is within half the diagonal
+    tracker.update(detections([25, 0, 40, 40]))
+    assert tracker.ids.tolist() == [1]
+
+
+def test_predict_coasts_with_velocity_and_decays_confidence():
+    tracker = VehicleTracker(detect_every=3, decay=0.5)
+    tracker.update(detections([0, 0, 50, 50]))
+    tracker.update(detections([10, 0, 50, 50]))
+
+    coasted = tracker.predict()
+    assert coasted.boxes[0, 0] > 10
+    assert float(coasted.scores[0]) < 0.9
+    assert tracker.ids.tolist() == [1]
+
+
+def test_needs_detection_every_n_frames_and_on_low_confidence():
+    tracker = VehicleTracker(detect_every=3, min_confidence=0.3, decay=0.9)
+    assert tracker.needs_detection()
+    tracker.update(detections([0, 0, 50, 50]))
+    # Detect, predict, predict, detect
+    assert not tracker.needs_detection()
+    tracker.predict()
+    assert not tracker.needs_detection()
+    tracker.predict()
+    assert tracker.needs_detection()
+
+    fading = VehicleTracker(detect_every=100, min_confidence=0.5, decay=0.5)
+    fading.update(detections([0, 0, 50, 50]))
+    fading.predict()
+    assert fading.needs_detection()
+
+
+def test_unmatched_track_dropped_after_max_misses():
+    tracker = VehicleTracker(detect_every=1, max_misses=2)
+    tracker.update(detections([0, 0, 50, 50]))
+    empty = detections()
+
+    tracker.update(empty)
+    tracker.update(empty)
+    assert tracker.ids.tolist() == [1]
+    tracker.update(empty)
+    assert len(tracker.ids) == 0
+
+    # A vehicle reappearing later is a new vehicle
+    tracker.update(detections([0, 0, 50, 50]))
+    assert tracker.ids.tolist() == [2]
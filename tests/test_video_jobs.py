@@ -0,0 +1,119 @@
+import threading
+
+import pytest
+
+from video_jobs import VideoJob, VideoJobManager, VideoQueueFullError
+
+
+def frame(number, count=1):
+    return {'frame_number': number, 'vehicle_count': count, 'breakdown': {'car': count}}
+
+
+def test_wait_frames_wakes_on_new_frame_and_on_finish():
+    job = VideoJob('job', 'video.mp4')
+    assert not job.wait_frames(0, timeout=0.01)
+
+    threading.Timer(0.05, job.add_frame, (frame(0), 1)).start()
+    assert job.wait_frames(0, timeout=5)
+
+    threading.Timer(0.05, job.set_status, ('done',)).start()
+    assert job.wait_frames(1, timeout=5)
+
+
+def test_manager_runs_and_cancels_jobs():
+    manager = VideoJobManager(workers=1)
+    started = threading.Event()
+
+    def analyze(job):
+        started.set()
+        while True:
+            job.check_cancelled()
+            job.wait_frames(0, timeout=0.01)
+
+    job = manager.submit('a.mp4', analyze)
+    assert started.wait(5)
+    manager.cancel(job.id)
+    job.future.result(timeout=5)
+    assert job.status == 'cancelled'
+
+    done = manager.submit('b.mp4', lambda job: {'ok': True})
+    done.future.result(timeout=5)
+    assert done.status == 'done'
+    assert done.summary()['result'] == {'ok': True}
+
+
+def test_partial_totals_while_running():
+    job = VideoJob('job', 'video.mp4')
+    job.set_total(10)
+    for n, count in enumerate([2, 6, 4]):
+        job.add_frame(frame(n, count), n + 1)
+    summary = job.summary()
+    assert summary['progress'] == 30.0
+    assert summary['processed_frames'] == 3
+    assert summary['partial'] == {'total_vehicles': 6, 'avg_vehicles_per_frame': 4.0,
+                                  'overall_breakdown': {'car': 12}}
+
+
+def test_failed_job_reports_its_error():
+    manager = VideoJobManager(workers=1)
+
+    def analyze(job):
+        raise ValueError("unreadable video")
+
+    job = manager.submit('bad.mp4', analyze)
+    job.future.result(timeout=5)
+    assert job.status == 'failed'
+    assert job.summary()['error'] == 'unreadable video'
+
+
+def test_manager_refuses_jobs_beyond_max_queued():
+    manager = VideoJobManager(workers=1, max_queued=1)
+    release = threading.Event()
+    running = manager.submit('a.mp4', lambda job: release.wait(5))
+    while running.status == 'queued':
+        running.wait_frames(0, timeout=0.01)
+    queued = manager.submit('b.mp4', lambda job: None)
+
+    with pytest.raises(VideoQueueFullError):
+        manager.submit('c.mp4', lambda job: None)
+
+    # A queued job can be cancelled before it starts
+    manager.cancel(queued.id)
+    assert queued.status == 'cancelled'
+    release.set()
+    running.future.result(timeout=5)
+
+
+def test_frames_since_reports_true_indexes_after_discard():
+    job = VideoJob('job', 'video.mp4', retain_frames=False)
+    for n in range(5):
+        job.add_frame(frame(n), n + 1)
+
+    job.discard_frames(3)
+    first, frames = job.frames_since(0)
+    assert first == 3
+    assert [f['frame_number'] for f in frames] == [3, 4]
+
+    first, frames = job.frames_since(4)
+    assert (first, len(frames)) == (4, 1)
+    first, frames = job.frames_since(5)
+    assert (first, frames) == (5, [])
+
+
+def test_discard_never_moves_backwards():
+    job = VideoJob('job', 'video.mp4', retain_frames=False)
+    for n in range(4):
+        job.add_frame(frame(n), n + 1)
+    job.discard_frames(3)
+    job.discard_frames(1)
+    assert job.frames_since(0)[0] == 3
+    assert job.processed == 4
+
+
+def test_totals_include_discarded_frames():
+    job = VideoJob('job', 'video.mp4', retain_frames=False)
+    for n, count in enumerate([2, 6, 4]):
+        job.add_frame(frame(n, count), n + 1)
+    job.discard_frames(3)
+    assert job.totals() == {'processed_frames': 3, 'total_vehicles': 6,
+                            'avg_vehicles_per_frame': 4.0, 'overall_breakdown': {'car': 12}}
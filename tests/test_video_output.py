@@ -0,0 +1,58 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from video_output import AnnotatedVideoWriter, VideoNotReadyError, read_thumbnail, thumbnail_name
+
+
+def frame(level):
+    return np.full((120, 160, 3), level, dtype=np.uint8)
+
+
+def decode(jpeg):
+    return cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+
+
+def test_thumbnail_name():
+    assert thumbnail_name('annotated_1_abc.mp4', 12) == 'annotated_1_abc_000012.jpg'
+
+
+def test_writer_indexes_frames_and_serves_thumbnails_once_closed(tmp_path):
+    writer = AnnotatedVideoWriter(str(tmp_path), 'annotated_job.mp4', fps=2.0, source_fps=10.0)
+    positions = [writer.write(frame(level), frame_number)
+                 for level, frame_number in ((40, 0), (120, 5), (200, 10))]
+    assert positions == [0, 1, 2]
+
+    # The MP4 cannot be read until the writer has finished it
+    with pytest.raises(VideoNotReadyError):
+        read_thumbnail(str(tmp_path), thumbnail_name(writer.filename, 1))
+
+    writer.close()
+    index = json.loads((tmp_path / 'annotated_job.json').read_text())
+    assert index['video'] == 'annotated_job.mp4'
+    assert index['frames'][1] == {'position': 1, 'frame_number': 5, 'timestamp': 0.5}
+
+    thumbnail = decode(read_thumbnail(str(tmp_path), thumbnail_name(writer.filename, 1)))
+    assert thumbnail.shape == (120, 160, 3)
+    assert abs(int(thumbnail.mean()) - 120) < 10
+
+    small = decode(read_thumbnail(str(tmp_path), thumbnail_name(writer.filename, 2), width=80))
+    assert small.shape == (60, 80, 3)
+
+
+def test_unknown_thumbnails(tmp_path):
+    writer = AnnotatedVideoWriter(str(tmp_path), 'annotated_job.mp4', fps=2.0, source_fps=10.0)
+    writer.write(frame(100), 0)
+    writer.close()
+
+    assert read_thumbnail(str(tmp_path), 'annotated_job_000099.jpg') is None
+    assert read_thumbnail(str(tmp_path), 'annotated_other_000000.jpg') is None
+    assert read_thumbnail(str(tmp_path), 'annotated_job.json') is None
+    assert read_thumbnail(str(tmp_path), '../annotated_job_000000.jpg') is None
+
+
+def test_closing_an_empty_writer_writes_nothing(tmp_path):
+    AnnotatedVideoWriter(str(tmp_path), 'annotated_job.mp4', fps=2.0, source_fps=10.0).close()
+    assert list(tmp_path.iterdir()) == []
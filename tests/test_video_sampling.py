@@ -0,0 +1,47 @@
+import cv2
+import pytest
+
+from conftest import NUMBERED_FRAMES
+from video_sampling import DEFAULT_FPS, sample_frames, video_fps
+from video_segments import split_segments
+
+
+def sampled(path, sample_rate, **kwargs):
+    cap = cv2.VideoCapture(path)
+    try:
+        return [(number, int(round(frame.mean() / 2))) for number, frame in
+                sample_frames(cap, sample_rate, **kwargs)]
+    finally:
+        cap.release()
+
+
+def test_samples_the_requested_frames(numbered_video):
+    samples = sampled(numbered_video, 4.0)
+    # 10 fps at 4 per second: frames at round(k * 2.5)
+    assert [number for number, _ in samples[:5]] == [0, 2, 5, 8, 10]
+    # The decoded pixels belong to the reported frame number
+    assert all(number == level for number, level in samples)
+
+
+def test_rate_at_or_above_fps_yields_every_frame(numbered_video):
+    assert len(sampled(numbered_video, 30.0)) == NUMBERED_FRAMES
+
+
+def test_seeking_matches_grabbing(numbered_video):
+    assert sampled(numbered_video, 0.5, seek_gap=5) == sampled(numbered_video, 0.5, seek_gap=1000)
+
+
+@pytest.mark.parametrize('sample_rate', [1.0, 3.0, 7.0])
+def test_segments_match_the_whole_video(numbered_video, sample_rate):
+    whole = [number for number, _ in sampled(numbered_video, sample_rate)]
+    pieces = []
+    for start, end in split_segments(NUMBERED_FRAMES, 4, min_frames=10):
+        pieces += [number for number, _ in sampled(numbered_video, sample_rate, start=start, end=end)]
+    assert pieces == whole
+
+
+def test_video_fps_falls_back_when_unknown():
+    class NoFps:
+        def get(self, prop):
+            return 0.0
+    assert video_fps(NoFps()) == DEFAULT_FPS
@@ -0,0 +1,9 @@
+from video_segments import split_segments
+
+
+def test_split_segments():
+    assert split_segments(100, 4) == [(0, 25), (25, 50), (50, 75), (75, None)]
+    # Never shorter than min_frames, always at least one range
+    assert split_segments(100, 8, min_frames=30) == [(0, 33), (33, 67), (67, None)]
+    assert split_segments(10, 4, min_frames=300) == [(0, None)]
+    assert split_segments(0, 4) == [(0, None)]
@@ -0,0 +1,153 @@
+"""
+IoU tracker for the live camera feed
+Carries vehicle boxes forward between detector runs with a constant-velocity
+prediction and keeps a persistent ID per vehicle for unique-vehicle counting
+"""
+import numpy as np
+
+from detector import Detections, box_iou
+
+
+class VehicleTracker:
+    def __init__(self, detect_every=3, min_confidence=0.3, decay=0.85, min_iou=0.3, max_misses=2):
+        """Track vehicles for one camera
+
+        Args:
+            detect_every: Run the detector at least every N frames
+            min_confidence: Run the detector early once any track's decayed
+                            confidence drops below this
+            decay: Confidence multiplier per frame a track is only predicted
+            min_iou: Minimum IoU between a predicted track and a detection to match
+            max_misses: Detector runs a track may go unmatched before it is dropped
+        """
+        self.detect_every = detect_every
+        self.min_confidence = min_confidence
+        self.decay = decay
+        self.min_iou = min_iou
+        self.max_misses = max_misses
+
+        self.labels = None
+        self.boxes = np.empty((0, 4), dtype=np.float32)     # Current [x, y, w, h]
+        self.anchors = np.empty((0, 4), dtype=np.float32)   # Box at the last match
+        self.velocity = np.empty((0, 4), dtype=np.float32)  # Per-frame box change
+        self.scores = np.empty(0, dtype=np.float32)
+        self.class_ids = np.empty(0, dtype=int)
+        self.ids = np.empty(0, dtype=int)
+        self.misses = np.empty(0, dtype=int)
+
+        self.frames_since_detection = detect_every  # Detect on the first frame
+        self.unique_breakdown = {}  # Label -> vehicles that received an ID
+        self._next_id = 1
+
+    @property
+    def unique_total(self):
+        return self._next_id - 1
+
+    def needs_detection(self):
+        """Whether the next frame should go through the detector"""
+        if self.frames_since_detection + 1 >= self.detect_every:
+            return True
+        return len(self.scores) > 0 and float(self.scores.min()) < self.min_confidence
+
+    def predict(self):
+        """Advance every track by one frame without running the detector
+
+        Returns:
+            Detections for the tracks; self.ids holds their IDs in the same order
+        """
+        self.boxes += self.velocity
+        self.scores *= self.decay
+        self.frames_since_detection += 1
+        return self.current()
+
+    def update(self, detections):
+        """Match a new frame's detections to the tracks
+
+        Returns:
+            Detections for the tracks; self.ids holds their IDs in the same order
+        """
+        self.labels = detections.labels
+        steps = self.frames_since_detection + 1
+        predicted = self.boxes + self.velocity
+        new_boxes = detections.boxes.astype(np.float32)
+
+        track_idx, det_idx = self._match(predicted, new_boxes)
+
+        # Matched tracks: take the detection, and smooth the measured velocity
+        # over the frames since their last match
+        measured = (new_boxes[det_idx] - self.anchors[track_idx]) / steps
+        self.velocity[track_idx] = 0.5 * self.velocity[track_idx] + 0.5 * measured
+        self.boxes = predicted
+        self.boxes[track_idx] = new_boxes[det_idx]
+        self.anchors[track_idx] = new_boxes[det_idx]
+        self.scores[track_idx] = detections.scores[det_idx]
+        self.class_ids[track_idx] = detections.class_ids[det_idx]
+        self.misses += 1
+        self.misses[track_idx] = 0
+        self.scores *= np.where(self.misses > 0, self.decay, 1.0).astype(np.float32)
+
+        keep = self.misses <= self.max_misses
+        self._keep(keep)
+
+        # Unmatched detections start new tracks
+        new = np.ones(len(detections), dtype=bool)
+        new[det_idx] = False
+        count = int(new.sum())
+        ids = np.arange(self._next_id, self._next_id + count)
+        self._next_id += count
+        for class_id in detections.class_ids[new].tolist():
+            label = self.labels[class_id]
+            self.unique_breakdown[label] = self.unique_breakdown.get(label, 0) + 1
+
+        self.boxes = np.concatenate([self.boxes, new_boxes[new]])
+        self.anchors = np.concatenate([self.anchors, new_boxes[new]])
+        self.velocity = np.concatenate([self.velocity, np.zeros((count, 4), dtype=np.float32)])
+        self.scores = np.concatenate([self.scores, detections.scores[new]])
+        self.class_ids = np.concatenate([self.class_ids, detections.class_ids[new]])
+        self.ids = np.concatenate([self.ids, ids])
+        self.misses = np.concatenate([self.misses, np.zeros(count, dtype=int)])
+
+        self.frames_since_detection = 0
+        return self.current()
+
+    def _match(self, tracks, boxes):
+        """Greedy one-to-one matching by IoU, then by centroid distance
+
+        Pairs that do not overlap enough (fast vehicles, new tracks with no
+        velocity yet) can still match when the detection's centre is within
+        half the track's diagonal of the predicted centre.
+
+        Returns:
+            (track indices, detection indices) as int arrays
+        """
+        iou = box_iou(tracks, boxes)
+        track_centres = tracks[:, :2] + tracks[:, 2:] / 2
+        centres = boxes[:, :2] + boxes[:, 2:] / 2
+        distance = np.linalg.norm(track_centres[:, None, :] - centres[None, :, :], axis=2)
+        reach = np.linalg.norm(tracks[:, 2:], axis=1)[:, None] / 2
+
+        used_tracks, used_dets = set(), set()
+        matches = []
+        for candidates, order in ((iou >= self.min_iou, -iou), (distance <= reach, distance)):
+            pairs = np.argwhere(candidates)
+            pairs = pairs[np.argsort(order[pairs[:, 0], pairs[:, 1]], kind='stable')]
+            for track, det in pairs.tolist():
+                if track not in used_tracks and det not in used_dets:
+                    used_tracks.add(track)
+                    used_dets.add(det)
+                    matches.append((track, det))
+        matches = np.array(matches, dtype=int).reshape(-1, 2)
+        return matches[:, 0], matches[:, 1]
+
+    def _keep(self, mask):
+        self.boxes = self.boxes[mask]
+        self.anchors = self.anchors[mask]
+        self.velocity = self.velocity[mask]
+        self.scores = self.scores[mask]
+        self.class_ids = self.class_ids[mask]
+        self.ids = self.ids[mask]
+        self.misses = self.misses[mask]
+
+    def current(self):
+        """Detections for the tracks as they are, without advancing them"""
+        return Detections(np.rint(self.boxes), self.scores, self.class_ids, self.labels)
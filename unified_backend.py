@@ -10,6 +10,23 @@ import threading
 import time
 import os
 import base64
+import json
+import atexit
+import uuid
+from collections import deque
+from detector import (DetectorSession, DetectorPool, MicroBatcher, ModelRegistry,
+                      TierController, Detections, DetectorBusyError, box_iou)
+from inference_workers import InferenceWorker
+from live_pipeline import (CameraRegistry, DetectionScheduler, LivePipeline, StatsBroadcaster,
+                           StreamAdapter)
+from tracker import VehicleTracker
+from motion_gate import MotionGate
+from lane_regions import LaneRegions
+from emergency_watch import EmergencyWatch
+from video_jobs import VideoJobManager, VideoQueueFullError
+from video_sampling import sample_frames, video_fps
+from video_segments import analyze_segments, split_segments
+from video_output import AnnotatedVideoWriter, VideoNotReadyError, read_thumbnail, thumbnail_name
 
 app = Flask(__name__)
 
@@ -17,6 +34,27 @@ app = Flask(__name__)
 UPLOAD_FOLDER = 'web_uploads'
 RESULTS_FOLDER = 'web_results'
 VIDEO_FRAMES_FOLDER = 'video_frames'
+VIDEO_RESULT_FRAMES = 20  # Annotated frames returned (and saved) per uploaded video
+VIDEO_JOB_WORKERS = 1      # Videos analyzed at once, so uploads cannot starve live detection
+VIDEO_JOB_MAX_QUEUED = 8   # Uploads waiting for a worker before new ones are refused
+VIDEO_SAMPLE_RATE = 2.0    # Frames analyzed per second of video (`sample_rate` form field overrides)
+VIDEO_MAX_SAMPLE_RATE = 30.0
+
+# Video output: 'frames' saves the first VIDEO_RESULT_FRAMES annotated frames
+# as JPEGs; 'video' writes every analyzed frame into one annotated MP4 plus a
+# frame -> timestamp index, and /frames/ cuts thumbnails from it on request.
+# An `output` form field overrides the mode per upload.
+VIDEO_OUTPUT_MODE = 'frames'
+VIDEO_OUTPUT_FOURCC = 'mp4v'  # 'avc1' for browser playback if OpenCV has H.264
+VIDEO_THUMBNAIL_WIDTH = 480
+
+# Segmented video analysis: with N > 1, each video is split into frame ranges
+# analyzed by N worker processes (each loads its own net, ~250MB for YOLOv3)
+# and merged back in order. Videos shorter than two segments, and 0/1, stay in
+# this process.
+VIDEO_SEGMENT_WORKERS = 0
+VIDEO_SEGMENTS_PER_WORKER = 4     # More, shorter segments balance load and report progress sooner
+VIDEO_SEGMENT_MIN_FRAMES = 300    # Shortest range worth a seek
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RESULTS_FOLDER, exist_ok=True)
 os.makedirs(VIDEO_FRAMES_FOLDER, exist_ok=True)
@@ -32,16 +70,88 @@ app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max
 # - OpenCV YOLO: For image upload, video analysis, and multi-lane intersection
 # =============================================================================
 
+# Live cameras: source is a webcam index, an RTSP/HTTP URL, or a video file with
+# loop=True as a stand-in. fps is the target detection rate; when the shared live
+# detectors cannot keep up, higher priority cameras are served first.
+# monitor=True keeps a camera running (and its stats updating) with no viewers.
+# Optional lanes maps a lane name to a polygon [[x, y], ...] in frame pixels:
+# detection then runs only on the crop around the lanes, and vehicles outside
+# every lane are not counted, e.g.
+#   'lanes': {'North': [[200, 0], [320, 0], [320, 240], [120, 240]], ...}
+CAMERAS = {
+    'main': {'source': 0, 'fps': 15, 'priority': 1, 'monitor': False},
+}
+DEFAULT_CAMERA = 'main'
+LIVE_DETECTORS = 1  # Detection threads shared by every live camera
+STATS_STREAM_MAX_RATE = 4  # Most /stats/stream updates per second per camera
+
+# MJPEG stream levels, best first: (JPEG quality, scale, max frames per second).
+# /video_feed?quality=&scale= picks the closest level; ?adaptive=1 moves a
+# client down the levels while its connection backs up and back up once it
+# keeps pace. Viewers on the same level share a single encoding per frame.
+STREAM_LEVELS = [
+    (95, 1.0, None),
+    (80, 1.0, None),
+    (65, 0.75, None),
+    (50, 0.5, None),
+    (35, 0.5, 5),
+]
+
+# Between detector runs the live feed carries boxes forward with a tracker.
+# The detector runs every LIVE_DETECT_EVERY frames, or sooner once a track's
+# confidence (decayed per predicted frame) drops below LIVE_TRACK_MIN_CONFIDENCE.
+LIVE_DETECT_EVERY = 3
+LIVE_TRACK_MIN_CONFIDENCE = 0.3
+
+# Frames where less than LIVE_MOTION_THRESHOLD of the (downscaled, grayscale)
+# pixels changed reuse the previous result instead of detecting or tracking
+LIVE_MOTION_GATE = True
+LIVE_MOTION_THRESHOLD = 0.01
+
+# Live emergency detection (best.pt) runs on the frame already being processed,
+# every LIVE_EMERGENCY_INTERVAL seconds or sooner when new vehicles appear. An
+# emergency is raised once LIVE_EMERGENCY_CONFIRM_HITS of the last
+# LIVE_EMERGENCY_WINDOW runs found one.
+LIVE_EMERGENCY = True
+LIVE_EMERGENCY_INTERVAL = 1.0
+LIVE_EMERGENCY_CONFIDENCE = 0.4
+LIVE_EMERGENCY_CONFIRM_HITS = 3
+LIVE_EMERGENCY_WINDOW = 5
+
 # Global variables for live camera
 current_stats = {
-    'vehicle_count': 0,
-    'breakdown': {},
-    'fps': 0,
-    'device': 'CPU',
-    'last_update': datetime.now()
+    'device': 'CPU'
+}
+camera_stats = {
+    camera_id: {
+        'vehicle_count': 0,
+        'breakdown': {},
+        'fps': 0,
+        'unique_vehicles': 0,
+        'unique_breakdown': {},
+        'skipped_ratio': 0.0,
+        'lanes': {},
+        'emergency': False,
+        'emergency_lanes': [],
+        'emergency_since': None,
+        'last_update': datetime.now()
+    }
+    for camera_id in CAMERAS
 }
 stats_lock = threading.Lock()
-camera_source = 0
+camera_trackers = {
+    camera_id: VehicleTracker(detect_every=LIVE_DETECT_EVERY, min_confidence=LIVE_TRACK_MIN_CONFIDENCE)
+    for camera_id in CAMERAS
+}
+camera_motion_gates = {camera_id: MotionGate(threshold=LIVE_MOTION_THRESHOLD) for camera_id in CAMERAS}
+camera_emergency_watches = {
+    camera_id: EmergencyWatch(interval=LIVE_EMERGENCY_INTERVAL, confirm_hits=LIVE_EMERGENCY_CONFIRM_HITS,
+                              window=LIVE_EMERGENCY_WINDOW)
+    for camera_id in CAMERAS
+}
+emergency_events = deque(maxlen=100)  # Most recent confirmed/cleared live emergencies
+camera_lanes = {camera_id: LaneRegions(config['lanes'])
+                for camera_id, config in CAMERAS.items() if config.get('lanes')}
 
 print("\n" + "=" * 70)
 print("INITIALIZING DUAL YOLO CONFIGURATION")
@@ -58,187 +168,255 @@ labels_path = f'{yolo_dir}/yolo-coco/coco.names'
 weights_path = f'{yolo_dir}/yolo-coco/yolov3.weights'
 config_path = f'{yolo_dir}/yolo-coco/yolov3.cfg'
 
-opencv_net = cv2.dnn.readNetFromDarknet(config_path, weights_path)
-opencv_net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
-opencv_net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
-
 LABELS = open(labels_path).read().strip().split("\n")
 vehicle_types = {'car', 'truck', 'bus', 'bicycle', 'motorbike', 'motorcycle'}
 
+# Detector settings for the OpenCV path
+OPENCV_CONFIDENCE = 0.5
+OPENCV_NMS_THRESHOLD = 0.3
+
+# Model tiers run through cv2.dnn, most accurate first. A tier is loaded the
+# first time it is used; tiers whose model files are missing are unavailable.
+# YOLOv8 ONNX: `yolo export model=yolov8n.pt format=onnx dynamic=True`
+# (dynamic axes are needed for batched forward passes)
+OPENCV_MODEL_TIERS = {
+    'yolov3-608': {'config_path': config_path, 'weights_path': weights_path, 'input_size': 608},
+    'yolov3-416': {'config_path': config_path, 'weights_path': weights_path, 'input_size': 416},
+    'yolov3-320': {'config_path': config_path, 'weights_path': weights_path, 'input_size': 320},
+    'yolov3-tiny': {'config_path': f'{yolo_dir}/yolo-coco/yolov3-tiny.cfg',
+                    'weights_path': f'{yolo_dir}/yolo-coco/yolov3-tiny.weights', 'input_size': 416},
+    'yolov8n-onnx': {'model_format': 'yolov8', 'config_path': None,
+                     'weights_path': 'yolov8n.onnx', 'input_size': 640},
+}
+DEFAULT_OPENCV_TIER = 'yolov3-416'
+
+# Tier used by each endpoint; a request may pick another one with a `tier`
+# form/query field
+ENDPOINT_MODEL_TIERS = {
+    'image': DEFAULT_OPENCV_TIER,
+    'multi': DEFAULT_OPENCV_TIER,
+    'emergency': DEFAULT_OPENCV_TIER,
+    'video': DEFAULT_OPENCV_TIER,
+    'live': DEFAULT_OPENCV_TIER,  # Only when PyTorch is not available
+}
+
+# Load-adaptive tiers: while the average detection latency (queueing included)
+# is above ADAPTIVE_LATENCY_TARGET seconds, requests on the ladder are served by
+# the next cheaper tier, stepping back up once load falls
+ADAPTIVE_TIERS = False
+ADAPTIVE_TIER_LADDER = ['yolov3-608', 'yolov3-416', 'yolov3-320', 'yolov3-tiny']
+ADAPTIVE_LATENCY_TARGET = 0.5
+
+# Flask serves requests on many threads; each one checks out its own net
+OPENCV_POOL_SIZE = 2          # Independent nets per tier (~250MB each for YOLOv3)
+OPENCV_POOL_MAX_WAITING = 16  # Requests allowed to queue for a free net
+OPENCV_POOL_TIMEOUT = 30.0    # Seconds a queued request waits before failing
+
+# Out-of-process inference: 0 keeps every model in this process. With N > 0,
+# N worker processes each load YOLOv3, YOLOv8 and best.pt once and run all
+# detection calls; frames reach them through shared memory.
+INFERENCE_WORKERS = 0
+
+# Micro-batching: concurrent single-frame calls (image, video, live, lanes) are
+# merged into one forward pass of up to OPENCV_BATCH_SIZE frames. A frame waits
+# at most OPENCV_BATCH_MAX_WAIT seconds for others to join. 1 disables batching.
+OPENCV_BATCH_SIZE = 8
+OPENCV_BATCH_MAX_WAIT = 0.005
+
+opencv_settings = {
+    'labels': LABELS,
+    'vehicle_types': vehicle_types,
+    'confidence': OPENCV_CONFIDENCE,
+    'threshold': OPENCV_NMS_THRESHOLD
+}
+
+def build_opencv_detector(tier, tier_settings):
+    """Load the nets for one model tier and wrap them in a pool / micro-batcher"""
+    print(f"Loading OpenCV model tier {tier}...")
+    session_settings = dict(opencv_settings, **tier_settings)
+    
+    if INFERENCE_WORKERS > 0:
+        worker_config = {
+            'opencv': session_settings,
+            # Only the default tier's workers also host the PyTorch models
+            'live_model': 'yolov8n.pt' if tier == DEFAULT_OPENCV_TIER else None,
+            'emergency_model': 'best.pt' if tier == DEFAULT_OPENCV_TIER else None,
+            'num_threads': max(1, (os.cpu_count() or 1) // INFERENCE_WORKERS)
+        }
+        pool = DetectorPool(lambda: InferenceWorker(worker_config),
+                            size=INFERENCE_WORKERS,
+                            max_waiting=OPENCV_POOL_MAX_WAITING,
+                            timeout=OPENCV_POOL_TIMEOUT)
+        atexit.register(lambda: [worker.close() for worker in pool.sessions])
+    else:
+        pool = DetectorPool(lambda: DetectorSession(**session_settings),
+                            size=OPENCV_POOL_SIZE,
+                            max_waiting=OPENCV_POOL_MAX_WAITING,
+                            timeout=OPENCV_POOL_TIMEOUT)
+    
+    if OPENCV_BATCH_SIZE > 1:
+        return MicroBatcher(pool,
+                            max_batch_size=OPENCV_BATCH_SIZE,
+                            max_wait=OPENCV_BATCH_MAX_WAIT,
+                            max_waiting=OPENCV_POOL_MAX_WAITING,
+                            timeout=OPENCV_POOL_TIMEOUT)
+    return pool
+
+opencv_models = ModelRegistry(OPENCV_MODEL_TIERS, build_opencv_detector)
+opencv_detector = opencv_models.get(DEFAULT_OPENCV_TIER)
+opencv_pool = getattr(opencv_detector, 'pool', opencv_detector)
+if INFERENCE_WORKERS > 0:
+    # Every worker loads the same models, so the first one speaks for all
+    worker_models = opencv_pool.sessions[0].models
+
+tier_controller = None
+if ADAPTIVE_TIERS:
+    tier_controller = TierController(
+        [tier for tier in ADAPTIVE_TIER_LADDER if opencv_models.is_available(tier)],
+        target_latency=ADAPTIVE_LATENCY_TARGET)
+
 np.random.seed(42)
 COLORS = np.random.randint(0, 255, size=(len(LABELS), 3), dtype="uint8")
 
-print("✓ OpenCV YOLOv3 model loaded on CPU!")
+if INFERENCE_WORKERS > 0:
+    print(f"✓ OpenCV YOLOv3 model loaded in {opencv_pool.size} inference workers!")
+else:
+    print(f"✓ OpenCV YOLOv3 model loaded on CPU! ({opencv_pool.size} nets)")
+print(f"  Model tiers available: {', '.join(opencv_models.available())}")
 
-def calculate_iou(box1, box2):
-    """Calculate Intersection over Union (IoU) between two bounding boxes.
-    Boxes are in format [x, y, width, height]"""
-    x1, y1, w1, h1 = box1
-    x2, y2, w2, h2 = box2
-    
-    # Calculate intersection area
-    x_left = max(x1, x2)
-    y_top = max(y1, y2)
-    x_right = min(x1 + w1, x2 + w2)
-    y_bottom = min(y1 + h1, y2 + h2)
-    
-    if x_right < x_left or y_bottom < y_top:
-        return 0.0
-    
-    intersection_area = (x_right - x_left) * (y_bottom - y_top)
-    box1_area = w1 * h1
-    box2_area = w2 * h2
-    union_area = box1_area + box2_area - intersection_area
+def select_opencv_detector(tier=None):
+    """Resolve the model tier for a call (after load adaptation) and return its detector"""
+    tier = tier or DEFAULT_OPENCV_TIER
+    if tier_controller is not None:
+        tier = tier_controller.select(tier)
+    return opencv_models.get(tier)
+
+def requested_tier(endpoint):
+    """Model tier for a request: the `tier` form/query field or the endpoint default
     
-    return intersection_area / union_area if union_area > 0 else 0.0
+    Raises ValueError for a tier that is unknown or whose files are missing
+    """
+    tier = request.values.get('tier') or ENDPOINT_MODEL_TIERS[endpoint]
+    if not opencv_models.is_available(tier):
+        raise ValueError(f"Model tier not available: {tier}")
+    return tier
 
-def detect_vehicles_opencv(frame, confidence=0.5, threshold=0.3, exclude_boxes=None):
+def detect_vehicles_opencv(frame, confidence=None, threshold=None, exclude_boxes=None, tier=None):
     """Detect vehicles using OpenCV YOLO - for image/video/multi-lane
     
+    Nothing is drawn on the frame; call render_vehicle_detections when an
+    annotated image is needed.
+    
     Args:
         frame: Image frame to process
-        confidence: Detection confidence threshold
-        threshold: NMS threshold
+        confidence: Detection confidence threshold (defaults to the session setting)
+        threshold: NMS threshold (defaults to the session setting)
         exclude_boxes: List of bounding boxes to exclude (e.g., emergency vehicles)
                       Format: [[x, y, w, h], ...]
-    """
-    (H, W) = frame.shape[:2]
-    
-    ln = opencv_net.getLayerNames()
-    ln = [ln[i - 1] for i in opencv_net.getUnconnectedOutLayers().flatten()]
-    
-    blob = cv2.dnn.blobFromImage(frame, 1/255.0, (416, 416), swapRB=True, crop=False)
-    opencv_net.setInput(blob)
-    layerOutputs = opencv_net.forward(ln)
+        tier: Model tier name (defaults to DEFAULT_OPENCV_TIER)
     
-    boxes = []
-    confidences = []
-    classIDs = []
+    Returns:
+        Detections for the frame
+    """
+    detector = select_opencv_detector(tier)
+    start = time.time()
+    boxes, confidences, classIDs = detector.detect(frame, confidence, threshold)
+    if tier_controller is not None:
+        tier_controller.record(time.time() - start)
+    return _exclude_overlapping(Detections(boxes, confidences, classIDs, LABELS), exclude_boxes)
+
+def detect_vehicles_opencv_batch(frames, confidence=None, threshold=None, exclude_boxes=None, tier=None):
+    """Detect vehicles in several frames with one batched OpenCV YOLO forward pass
     
-    for output in layerOutputs:
-        for detection in output:
-            scores = detection[5:]
-            classID = np.argmax(scores)
-            conf = scores[classID]
-            
-            if conf > confidence:
-                box = detection[0:4] * np.array([W, H, W, H])
-                (centerX, centerY, width, height) = box.astype("int")
-                x = int(centerX - (width / 2))
-                y = int(centerY - (height / 2))
-                boxes.append([x, y, int(width), int(height)])
-                confidences.append(float(conf))
-                classIDs.append(classID)
-    
-    idxs = cv2.dnn.NMSBoxes(boxes, confidences, confidence, threshold)
-    
-    vehicle_count = 0
-    vehicle_breakdown = {}
-    detections = []
-    
-    if len(idxs) > 0:
-        for i in idxs.flatten():
-            label = LABELS[classIDs[i]]
-            
-            if label in vehicle_types:
-                # Check if this detection overlaps with any excluded boxes (e.g., emergency vehicles)
-                is_excluded = False
-                if exclude_boxes:
-                    current_box = boxes[i]
-                    for exclude_box in exclude_boxes:
-                        iou = calculate_iou(current_box, exclude_box)
-                        if iou > 0.3:  # If overlap is more than 30%, skip this detection
-                            is_excluded = True
-                            print(f"  Skipping {label} detection (overlaps with emergency vehicle, IoU={iou:.2f})")
-                            break
-                
-                if is_excluded:
-                    continue
-                
-                vehicle_count += 1
-                vehicle_breakdown[label] = vehicle_breakdown.get(label, 0) + 1
-                
-                (x, y, w, h) = boxes[i]
-                color = [int(c) for c in COLORS[classIDs[i]]]
-                cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
-                
-                text = f"{label}: {confidences[i]:.2f}"
-                cv2.putText(frame, text, (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 
-                           0.5, color, 2)
-                
-                detections.append({
-                    'type': label,
-                    'confidence': f"{confidences[i]:.2%}",
-                    'bbox': [x, y, w, h]
-                })
-    
-    return frame, vehicle_count, vehicle_breakdown, detections
+    Args:
+        frames: List of image frames to process
+        confidence: Detection confidence threshold (defaults to the session setting)
+        threshold: NMS threshold (defaults to the session setting)
+        exclude_boxes: Optional list with one exclude-box list per frame
+        tier: Model tier name (defaults to DEFAULT_OPENCV_TIER)
+    
+    Returns:
+        List of Detections, one per frame
+    """
+    if exclude_boxes is None:
+        exclude_boxes = [None] * len(frames)
+    
+    detector = select_opencv_detector(tier)
+    start = time.time()
+    batch = detector.detect_batch(frames, confidence, threshold)
+    if tier_controller is not None:
+        tier_controller.record(time.time() - start)
+    return [
+        _exclude_overlapping(Detections(boxes, confidences, classIDs, LABELS), frame_exclude_boxes)
+        for (boxes, confidences, classIDs), frame_exclude_boxes in zip(batch, exclude_boxes)
+    ]
+
+def _exclude_overlapping(detections, exclude_boxes):
+    """Drop detections that overlap any excluded box (e.g., emergency vehicles)
+    by more than 30%, comparing every pair in one step"""
+    if exclude_boxes is None or len(exclude_boxes) == 0 or len(detections) == 0:
+        return detections
+    
+    excluded = (box_iou(detections.boxes, exclude_boxes) > 0.3).any(axis=1)
+    if excluded.any():
+        print(f"  Skipping {int(excluded.sum())} detection(s) overlapping emergency vehicles")
+    return detections.select(~excluded)
 
 # =============================================================================
 # PYTORCH YOLO IMPLEMENTATION (GPU-Accelerated) - OPTIONAL
 # Used for: Live Camera Detection Only
 # =============================================================================
 
+vehicle_classes = [2, 3, 5, 7]  # car, motorcycle, bus, truck
+vehicle_names = {2: 'car', 3: 'motorcycle', 5: 'bus', 7: 'truck'}
+
 USE_PYTORCH_LIVE = False
 try:
     print("\n[2/2] Loading PyTorch YOLO (for Live Camera)...")
-    import torch
-    from ultralytics import YOLO
-    
-    print(f"PyTorch version: {torch.__version__}")
-    print(f"CUDA available: {torch.cuda.is_available()}")
-    
-    if torch.cuda.is_available():
-        device = 'cuda'
-        print(f"✓ GPU ENABLED: {torch.cuda.get_device_name(0)}")
-        current_stats['device'] = f"GPU: {torch.cuda.get_device_name(0)}"
+    if INFERENCE_WORKERS > 0:
+        if not worker_models['live']:
+            raise ImportError("YOLOv8 could not be loaded by the inference workers")
+        current_stats['device'] = worker_models['device']
+        print(f"✓ PyTorch YOLOv8 model loaded in inference workers ({worker_models['device']})!")
+        
+        def _run_live_model(frame, confidence):
+            with opencv_pool.session() as worker:
+                return worker.detect_live([frame], confidence)[0]
     else:
-        device = 'cpu'
-        print("⚠ GPU not detected, using CPU with PyTorch")
-        current_stats['device'] = "CPU (PyTorch)"
-    
-    pytorch_model = YOLO('yolov8n.pt')
-    pytorch_model.to(device)
-    print(f"✓ PyTorch YOLOv8 model loaded on {device.upper()}!")
-    
-    vehicle_classes = [2, 3, 5, 7]  # car, motorcycle, bus, truck
-    vehicle_names = {2: 'car', 3: 'motorcycle', 5: 'bus', 7: 'truck'}
+        import torch
+        from ultralytics import YOLO
+        
+        print(f"PyTorch version: {torch.__version__}")
+        print(f"CUDA available: {torch.cuda.is_available()}")
+        
+        if torch.cuda.is_available():
+            device = 'cuda'
+            print(f"✓ GPU ENABLED: {torch.cuda.get_device_name(0)}")
+            current_stats['device'] = f"GPU: {torch.cuda.get_device_name(0)}"
+        else:
+            device = 'cpu'
+            print("⚠ GPU not detected, using CPU with PyTorch")
+            current_stats['device'] = "CPU (PyTorch)"
+        
+        pytorch_model = YOLO('yolov8n.pt')
+        pytorch_model.to(device)
+        # Ultralytics predictors are not thread-safe; LIVE_DETECTORS threads share this one
+        pytorch_lock = threading.Lock()
+        print(f"✓ PyTorch YOLOv8 model loaded on {device.upper()}!")
+        
+        def _run_live_model(frame, confidence):
+            with pytorch_lock:
+                return pytorch_model(frame, conf=confidence, device=device, verbose=False)[0].boxes.data.cpu().numpy()
     
     USE_PYTORCH_LIVE = True
     
     def detect_vehicles_pytorch(frame, confidence=0.4):
-        """Detect vehicles using PyTorch YOLO - for live camera only"""
-        (H, W) = frame.shape[:2]
-        results = pytorch_model(frame, conf=confidence, device=device, verbose=False)[0]
-        
-        vehicle_count = 0
-        vehicle_breakdown = {}
-        detections = []
-        
-        for detection in results.boxes.data:
-            x1, y1, x2, y2, conf, cls = detection
-            cls = int(cls)
-            
-            if cls in vehicle_classes:
-                vehicle_count += 1
-                vehicle_type = vehicle_names.get(cls, 'vehicle')
-                vehicle_breakdown[vehicle_type] = vehicle_breakdown.get(vehicle_type, 0) + 1
-                
-                x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                color = (0, 255, 0)
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                
-                label = f"{vehicle_type} {conf:.2f}"
-                cv2.putText(frame, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 
-                           0.5, color, 2)
-                
-                detections.append({
-                    'type': vehicle_type,
-                    'confidence': f"{conf:.2%}",
-                    'bbox': [x1, y1, x2-x1, y2-y1]
-                })
+        """Detect vehicles using PyTorch YOLO - for live camera only
         
-        return frame, vehicle_count, vehicle_breakdown, detections
+        Returns Detections; nothing is drawn on the frame
+        """
+        return Detections.from_xyxy(_run_live_model(frame, confidence), vehicle_names,
+                                    class_ids=vehicle_classes)
     
 except ImportError as e:
     print(f"⚠ PyTorch not available: {e}")
@@ -254,89 +432,224 @@ except ImportError as e:
 EMERGENCY_MODEL_AVAILABLE = False
 emergency_model = None
 
+EMERGENCY_LABELS = ['ambulance']
+
+def _emergency_detections(boxes_data):
+    """Detections from best.pt [x1, y1, x2, y2, conf, cls] rows
+    
+    Assuming class 0 is ambulance/emergency vehicle in best.pt model, every
+    detection is reported as an ambulance
+    """
+    data = np.array(boxes_data, dtype=np.float32).reshape(-1, 6)
+    data[:, 5] = 0
+    return Detections.from_xyxy(data, EMERGENCY_LABELS)
+
 try:
     print("\n[EMERGENCY] Loading Emergency Vehicle Detection Model...")
-    import torch
-    from ultralytics import YOLO
-    
-    # Load the custom trained best.pt model for ambulance detection
-    emergency_model = YOLO('best.pt')
-    
-    if torch.cuda.is_available():
-        emergency_device = 'cuda'
-        emergency_model.to(emergency_device)
-        print(f"✓ Emergency vehicle model (best.pt) loaded on GPU!")
+    if INFERENCE_WORKERS > 0:
+        if not worker_models['emergency']:
+            raise RuntimeError("best.pt could not be loaded by the inference workers")
+        print("✓ Emergency vehicle model (best.pt) loaded in inference workers!")
+        
+        def _run_emergency_model(frames, confidence):
+            with opencv_pool.session() as worker:
+                return worker.detect_emergency(frames, confidence)
     else:
-        emergency_device = 'cpu'
-        print("✓ Emergency vehicle model (best.pt) loaded on CPU")
+        import torch
+        from ultralytics import YOLO
+        
+        # Load the custom trained best.pt model for ambulance detection
+        emergency_model = YOLO('best.pt')
+        
+        if torch.cuda.is_available():
+            emergency_device = 'cuda'
+            emergency_model.to(emergency_device)
+            print(f"✓ Emergency vehicle model (best.pt) loaded on GPU!")
+        else:
+            emergency_device = 'cpu'
+            print("✓ Emergency vehicle model (best.pt) loaded on CPU")
+        
+        # Shared by /upload-emergency request threads and the live emergency watch
+        emergency_lock = threading.Lock()
+        
+        def _run_emergency_model(frames, confidence):
+            with emergency_lock:
+                results = emergency_model(frames, conf=confidence, device=emergency_device, verbose=False)
+                return [result.boxes.data.cpu().numpy() for result in results]
     
     EMERGENCY_MODEL_AVAILABLE = True
     
     def detect_emergency_vehicles(frame, confidence=0.4):
-        """Detect emergency vehicles (ambulances) using custom best.pt model"""
-        (H, W) = frame.shape[:2]
-        results = emergency_model(frame, conf=confidence, device=emergency_device, verbose=False)[0]
-        
-        emergency_count = 0
-        emergency_detections = []
+        """Detect emergency vehicles (ambulances) using custom best.pt model
         
-        for detection in results.boxes.data:
-            x1, y1, x2, y2, conf, cls = detection
-            
-            # Assuming class 0 is ambulance/emergency vehicle in best.pt model
-            emergency_count += 1
-            
-            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-            
-            # Draw RED bounding box for emergency vehicles
-            color = (0, 0, 255)  # Red color for emergency vehicles
-            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 3)
-            
-            label = f"AMBULANCE {conf:.2f}"
-            # Add text with background for better visibility
-            (text_w, text_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-            cv2.rectangle(frame, (x1, y1 - text_h - 10), (x1 + text_w, y1), color, -1)
-            cv2.putText(frame, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 
-                       0.6, (255, 255, 255), 2)
-            
-            emergency_detections.append({
-                'type': 'ambulance',
-                'confidence': f"{conf:.2%}",
-                'bbox': [x1, y1, x2-x1, y2-y1]
-            })
-        
-        return frame, emergency_count, emergency_detections
+        Returns Detections; nothing is drawn on the frame
+        """
+        return _emergency_detections(_run_emergency_model([frame], confidence)[0])
+    
+    def detect_emergency_vehicles_batch(frames, confidence=0.4):
+        """Detect emergency vehicles in several frames with one best.pt model call"""
+        return [_emergency_detections(data) for data in _run_emergency_model(frames, confidence)]
     
 except Exception as e:
     print(f"⚠ Emergency vehicle model not available: {e}")
     print("→ Emergency vehicle detection will not be available")
     EMERGENCY_MODEL_AVAILABLE = False
 
+# =============================================================================
+# ANNOTATION RENDERING
+# Only used where an annotated image is actually returned or streamed
+# =============================================================================
+
+def render_vehicle_detections(frame, detections, color=None, ids=None):
+    """Draw vehicle boxes and labels onto the frame in place
+    
+    Args:
+        color: Fixed BGR color, or None to color by class (COLORS)
+        ids: Optional track IDs, in the same order as detections
+    """
+    ids = ids.tolist() if ids is not None else [None] * len(detections)
+    for (x, y, w, h), score, class_id, track_id in zip(detections.boxes.tolist(),
+                                                        detections.scores.tolist(),
+                                                        detections.class_ids.tolist(), ids):
+        box_color = color or [int(c) for c in COLORS[class_id]]
+        cv2.rectangle(frame, (x, y), (x + w, y + h), box_color, 2)
+        
+        text = f"{detections.labels[class_id]}: {score:.2f}"
+        if track_id is not None:
+            text = f"#{track_id} {text}"
+        cv2.putText(frame, text, (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 
+                   0.5, box_color, 2)
+    return frame
+
+def render_emergency_detections(frame, detections):
+    """Draw RED emergency vehicle boxes with filled labels onto the frame in place"""
+    color = (0, 0, 255)  # Red color (BGR format)
+    for (x1, y1, w, h), score in zip(detections.boxes.tolist(), detections.scores.tolist()):
+        x2, y2 = x1 + w, y1 + h
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 3)
+        
+        label = f"AMBULANCE {score:.2f}"
+        # Add text with background for better visibility
+        (text_w, text_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+        cv2.rectangle(frame, (x1, y1 - text_h - 10), (x1 + text_w, y1), color, -1)
+        cv2.putText(frame, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 
+                   0.6, (255, 255, 255), 2)
+    return frame
+
+# Live stats panel: the pre-rendered panel is blended over just its own region
+# of the frame, so no full-frame copy or full-frame blend is needed
+LIVE_PANEL_RECT = (10, 10, 350, 140)  # x1, y1, x2, y2 (inclusive)
+LIVE_PANEL_ALPHA = 0.6
+live_panel_template = np.zeros((LIVE_PANEL_RECT[3] - LIVE_PANEL_RECT[1] + 1,
+                                LIVE_PANEL_RECT[2] - LIVE_PANEL_RECT[0] + 1, 3), dtype=np.uint8)
+
+def blend_live_panel(frame):
+    """Blend the live stats panel onto the frame in place"""
+    x1, y1, x2, y2 = LIVE_PANEL_RECT
+    roi = frame[y1:y2 + 1, x1:x2 + 1]
+    template = live_panel_template[:roi.shape[0], :roi.shape[1]]
+    cv2.addWeighted(template, LIVE_PANEL_ALPHA, roi, 1 - LIVE_PANEL_ALPHA, 0, dst=roi)
+
+def draw_summary_overlay(result_image, count):
+    """Draw the total vehicle count banner on a result image"""
+    summary = f"Total Vehicles: {count}"
+    cv2.rectangle(result_image, (10, 10), (400, 50), (0, 0, 0), -1)
+    cv2.putText(result_image, summary, (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 
+               1.2, (0, 255, 0), 3)
+
 # =============================================================================
 # UNIFIED DETECTION FUNCTIONS
 # =============================================================================
 
-def detect_vehicles_live(frame):
+def emergency_lanes(camera_id):
+    """Names of the lanes holding the live emergency detections (see EmergencyWatch.detections)"""
+    lanes = camera_lanes.get(camera_id)
+    detections = camera_emergency_watches[camera_id].detections
+    if lanes is None or detections is None:
+        return []
+    hits = lanes.assign(detections.boxes)
+    return [lanes.names[idx] for idx in np.unique(hits[hits >= 0]).tolist()]
+
+def record_emergency_event(camera_id, event, detections):
+    """Log a confirmed or cleared live emergency"""
+    lane_names = emergency_lanes(camera_id)
+    if event == 'confirmed':
+        print(f"🚨 Emergency vehicle confirmed on camera {camera_id}" +
+              (f" ({', '.join(lane_names)})" if lane_names else ""))
+    else:
+        print(f"✓ Emergency cleared on camera {camera_id}")
+    emergency_events.append({
+        'camera': camera_id,
+        'event': event,
+        'lanes': lane_names,
+        'count': len(detections),
+        'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    })
+
+def detect_vehicles_live(frame, camera_id=DEFAULT_CAMERA):
     """
     Detection for live camera - uses PyTorch YOLO if available, otherwise OpenCV YOLO
     """
     (H, W) = frame.shape[:2]
-    
-    # Use PyTorch for live camera if available, otherwise fall back to OpenCV
-    if USE_PYTORCH_LIVE:
-        frame, vehicle_count, vehicle_breakdown, _ = detect_vehicles_pytorch(frame)
+    tracker = camera_trackers[camera_id]
+    gate = camera_motion_gates[camera_id]
+    watch = camera_emergency_watches[camera_id]
+    lanes = camera_lanes.get(camera_id)
+    tracked_before = tracker.unique_total
+    
+    # With lanes configured, only the area around them is gated and detected
+    region, (dx, dy) = lanes.crop(frame) if lanes is not None else (frame, (0, 0))
+    
+    if LIVE_MOTION_GATE and not gate.changed(region):
+        # Nothing moved: keep the previous boxes and counts
+        detections = tracker.current()
+    elif tracker.needs_detection():
+        # Use PyTorch for live camera if available, otherwise fall back to OpenCV
+        if USE_PYTORCH_LIVE:
+            detections = detect_vehicles_pytorch(region)
+        else:
+            detections = detect_vehicles_opencv(region, tier=ENDPOINT_MODEL_TIERS['live'])
+        if lanes is not None:
+            detections = detections.shifted(dx, dy)
+            detections = detections.select(lanes.assign(detections.boxes) >= 0)
+        detections = tracker.update(detections)
     else:
-        frame, vehicle_count, vehicle_breakdown, _ = detect_vehicles_opencv(frame)
+        detections = tracker.predict()
+    
+    # Emergency model on the same frame, at its own cadence
+    if LIVE_EMERGENCY and EMERGENCY_MODEL_AVAILABLE and watch.due(tracker.unique_total > tracked_before):
+        emergency = detect_emergency_vehicles(region, LIVE_EMERGENCY_CONFIDENCE).shifted(dx, dy)
+        event = watch.record(emergency)
+        if event is not None:
+            record_emergency_event(camera_id, event, emergency)
+    
+    render_vehicle_detections(frame, detections, color=(0, 255, 0) if USE_PYTORCH_LIVE else None,
+                              ids=tracker.ids)
+    if watch.active:
+        render_emergency_detections(frame, watch.detections)
+    vehicle_count = len(detections)
+    vehicle_breakdown = detections.breakdown()
+    lane_counts = {}
+    if lanes is not None:
+        lane_counts = lanes.counts(lanes.assign(detections.boxes))
+        cv2.polylines(frame, lanes.polygons, True, (255, 200, 0), 2)
     
     with stats_lock:
-        current_stats['vehicle_count'] = vehicle_count
-        current_stats['breakdown'] = vehicle_breakdown
-        current_stats['last_update'] = datetime.now()
+        stats = camera_stats[camera_id]
+        stats['vehicle_count'] = vehicle_count
+        stats['breakdown'] = vehicle_breakdown
+        stats['unique_vehicles'] = tracker.unique_total
+        stats['unique_breakdown'] = dict(tracker.unique_breakdown)
+        stats['skipped_ratio'] = round(gate.skipped_ratio, 3)
+        stats['lanes'] = lane_counts
+        stats['emergency'] = watch.active
+        stats['emergency_lanes'] = emergency_lanes(camera_id) if watch.active else []
+        stats['emergency_since'] = watch.since
+        stats['last_update'] = datetime.now()
+    stats_broadcaster.notify()
     
     # Add overlay
-    overlay = frame.copy()
-    cv2.rectangle(overlay, (10, 10), (350, 140), (0, 0, 0), -1)
-    cv2.addWeighted(overlay, 0.6, frame, 0.4, 0, frame)
+    blend_live_panel(frame)
     
     cv2.putText(frame, f"Vehicles: {vehicle_count}", (20, 40), 
                cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 0), 2)
@@ -357,81 +670,246 @@ def detect_vehicles_live(frame):
     
     return frame
 
-def detect_vehicles_image(image_path):
+def detect_vehicles_image(image_path, tier=None):
     """
     Detection for uploaded images - ALWAYS uses OpenCV YOLO for more accurate results
-    Used by: Image Upload, Video Analysis, Multi-Lane Intersection
+    Used by: Image Upload
+    
+    Returns:
+        (annotated image, Detections)
     """
     image = cv2.imread(image_path)
     
     # ALWAYS use OpenCV YOLO for image/video/multi-lane (more accurate)
-    result_image, count, breakdown, detections = detect_vehicles_opencv(image)
+    detections = detect_vehicles_opencv(image, tier=tier)
     
-    # Add summary overlay
-    summary = f"Total Vehicles: {count}"
-    cv2.rectangle(result_image, (10, 10), (400, 50), (0, 0, 0), -1)
-    cv2.putText(result_image, summary, (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 
-               1.2, (0, 255, 0), 3)
+    render_vehicle_detections(image, detections)
+    draw_summary_overlay(image, len(detections))
     
-    return result_image, count, breakdown, detections
+    return image, detections
 
-# =============================================================================
-# FLASK ROUTES - LIVE CAMERA
-# =============================================================================
-
-def generate_frames():
-    """Generate video frames with detection"""
-    camera = cv2.VideoCapture(camera_source)
-    
-    camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+def read_lane_uploads(lane_names, timestamp, prefix='', error_fields=None):
+    """Save and decode the lane1..laneN uploads before any inference runs
     
-    frame_count = 0
-    start_time = time.time()
-    skip_frames = 1 if USE_PYTORCH_LIVE else 2  # PyTorch processes faster
-    last_processed_frame = None
+    Args:
+        lane_names: Lane names, in lane1..laneN order
+        timestamp: Timestamp used in the saved upload filenames
+        prefix: Extra filename prefix placed before the lane name
+        error_fields: Extra fields (e.g. zero counts) added to error entries
+    
+    Returns:
+        (results, lane_images): results has one entry per lane, pre-filled with
+        an error dict for lanes that failed; lane_images maps lane index to
+        (filename, decoded image) for lanes ready for detection
+    """
+    error_fields = error_fields or {}
+    results = [None] * len(lane_names)
+    lane_images = {}
     
-    while True:
-        success, frame = camera.read()
-        if not success:
-            break
+    for idx, lane in enumerate(lane_names):
+        file_key = f'lane{idx + 1}'
+        
+        if file_key not in request.files:
+            results[idx] = {'lane': lane, 'error': 'No image uploaded', **error_fields}
+            continue
         
-        if frame_count % skip_frames == 0:
-            frame = detect_vehicles_live(frame)
-            last_processed_frame = frame.copy()
-        elif last_processed_frame is not None and not USE_PYTORCH_LIVE:
-            frame = last_processed_frame
+        file = request.files[file_key]
+        if file.filename == '':
+            results[idx] = {'lane': lane, 'error': 'No file selected', **error_fields}
+            continue
         
-        frame_count += 1
-        if frame_count % 30 == 0:
-            elapsed = time.time() - start_time
-            fps = frame_count / elapsed
-            with stats_lock:
-                current_stats['fps'] = round(fps, 1)
+        filename = f"{timestamp}_{prefix}{lane}_{file.filename}"
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        file.save(filepath)
         
-        ret, buffer = cv2.imencode('.jpg', frame)
-        frame = buffer.tobytes()
+        image = cv2.imread(filepath)
+        if image is None:
+            results[idx] = {'lane': lane, 'error': f"Failed to read image: {filepath}", **error_fields}
+            continue
         
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+        lane_images[idx] = (filename, image)
+    
+    return results, lane_images
+
+# =============================================================================
+# FLASK ROUTES - LIVE CAMERA
+# =============================================================================
+
+def update_live_fps(camera_id, fps):
+    with stats_lock:
+        camera_stats[camera_id]['fps'] = round(fps, 1)
+    stats_broadcaster.notify()
+
+def build_live_pipeline(camera_id, config):
+    return LivePipeline(config['source'],
+                        lambda frame: detect_vehicles_live(frame, camera_id),
+                        live_scheduler,
+                        fps=config.get('fps', 15),
+                        priority=config.get('priority', 0),
+                        loop=config.get('loop', False),
+                        on_fps=lambda fps: update_live_fps(camera_id, fps))
+
+# Detection threads are shared by every camera; each camera has one capture
+# pipeline shared by all of its /video_feed clients
+live_scheduler = DetectionScheduler(LIVE_DETECTORS)
+live_cameras = CameraRegistry(CAMERAS, build_live_pipeline)
+atexit.register(live_cameras.stop_all)
+
+def generate_frames(pipeline, level=0, adaptive=False):
+    """Generate video frames with detection
     
-    camera.release()
+    Every client reads the newest frame from the camera's shared LivePipeline,
+    encoded at its STREAM_LEVELS level; frames a slow client misses are dropped.
+    """
+    adapter = StreamAdapter(len(STREAM_LEVELS), level) if adaptive else None
+    quality, scale, max_fps = STREAM_LEVELS[level]
+    encoding = pipeline.acquire_encoding(quality, scale)
+    try:
+        seq = encoding.seq
+        while True:
+            frame, new_seq = encoding.get(seq)
+            if frame is None:
+                break
+            skipped = new_seq - seq - 1
+            seq = new_seq
+            
+            sent = time.time()
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+            
+            if max_fps:
+                # Frames skipped while throttled are not a sign of a slow client
+                time.sleep(max(0.0, 1.0 / max_fps - (time.time() - sent)))
+                skipped = 0
+            
+            if adapter is not None and adapter.record(skipped) != level:
+                pipeline.release_encoding(quality, scale)
+                level = adapter.level
+                quality, scale, max_fps = STREAM_LEVELS[level]
+                encoding = pipeline.acquire_encoding(quality, scale)
+                seq = encoding.seq
+    finally:
+        pipeline.release_encoding(quality, scale)
+
+def stream_camera(camera_id, level, adaptive):
+    with live_cameras.subscribe(camera_id) as pipeline:
+        yield from generate_frames(pipeline, level, adaptive)
+
+def requested_stream_level():
+    """STREAM_LEVELS index closest to the `quality` and `scale` query parameters
+    
+    Raises ValueError for values that are not numbers
+    """
+    quality = int(request.args.get('quality', STREAM_LEVELS[0][0]))
+    scale = float(request.args.get('scale', STREAM_LEVELS[0][1]))
+    distances = [abs(level_quality - quality) / 100 + abs(level_scale - scale)
+                 for level_quality, level_scale, _ in STREAM_LEVELS]
+    return distances.index(min(distances))
 
 @app.route('/video_feed')
-def video_feed():
-    return Response(generate_frames(),
+@app.route('/video_feed/<camera_id>')
+def video_feed(camera_id=DEFAULT_CAMERA):
+    """MJPEG stream; optional ?quality=1-100, ?scale=0-1 and ?adaptive=1"""
+    if camera_id not in CAMERAS:
+        return jsonify({'error': f'Unknown camera: {camera_id}'}), 404
+    try:
+        level = requested_stream_level()
+    except ValueError:
+        return jsonify({'error': 'quality and scale must be numbers'}), 400
+    adaptive = request.args.get('adaptive', '0').lower() in ('1', 'true', 'yes')
+    return Response(stream_camera(camera_id, level, adaptive),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+def camera_stats_json(camera_id):
+    """Stats for one camera as returned by /stats (call with stats_lock held)"""
+    stats = camera_stats[camera_id]
+    return {
+        'vehicle_count': stats['vehicle_count'],
+        'breakdown': stats['breakdown'],
+        'fps': stats['fps'],
+        'unique_vehicles': stats['unique_vehicles'],
+        'unique_breakdown': stats['unique_breakdown'],
+        'skipped_ratio': stats['skipped_ratio'],
+        'lanes': stats['lanes'],
+        'emergency': stats['emergency'],
+        'emergency_lanes': stats['emergency_lanes'],
+        'emergency_since': (datetime.fromtimestamp(stats['emergency_since']).strftime("%H:%M:%S")
+                            if stats['emergency_since'] else None),
+        'device': current_stats['device'],
+        'timestamp': stats['last_update'].strftime("%H:%M:%S")
+    }
+
 @app.route('/stats')
 def get_stats():
+    camera_id = request.args.get('camera', DEFAULT_CAMERA)
+    if camera_id not in CAMERAS:
+        return jsonify({'error': f'Unknown camera: {camera_id}'}), 404
     with stats_lock:
-        return jsonify({
-            'vehicle_count': current_stats['vehicle_count'],
-            'breakdown': current_stats['breakdown'],
-            'fps': current_stats['fps'],
-            'device': current_stats['device'],
-            'timestamp': current_stats['last_update'].strftime("%H:%M:%S")
-        })
+        return jsonify(camera_stats_json(camera_id))
+
+def stats_snapshot():
+    """Serialized /stats payload for every camera, built once per broadcast"""
+    with stats_lock:
+        return {camera_id: json.dumps(camera_stats_json(camera_id)) for camera_id in CAMERAS}
+
+# Live detection only flags changes; one thread serializes and fans them out
+stats_broadcaster = StatsBroadcaster(stats_snapshot, CAMERAS, min_interval=1.0 / STATS_STREAM_MAX_RATE)
+
+@app.route('/stats/stream')
+def stream_stats():
+    """Server-Sent Events version of /stats: pushes a camera's stats when they change"""
+    camera_id = request.args.get('camera', DEFAULT_CAMERA)
+    if camera_id not in CAMERAS:
+        return jsonify({'error': f'Unknown camera: {camera_id}'}), 404
+    channel = stats_broadcaster.channels[camera_id]
+    
+    def events():
+        seq = channel.seq
+        with stats_lock:
+            payload = json.dumps(camera_stats_json(camera_id))
+        yield f"data: {payload}\n\n"
+        while True:
+            payload, seq = channel.get(seq, timeout=15)
+            if payload is None:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                continue
+            yield f"data: {payload}\n\n"
+    
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/cameras', methods=['GET'])
+def get_cameras():
+    """List the configured cameras with their live status and stats"""
+    status = live_cameras.status()
+    with stats_lock:
+        cameras = [
+            {
+                'id': camera_id,
+                'target_fps': config.get('fps', 15),
+                'priority': config.get('priority', 0),
+                'monitor': config.get('monitor', False),
+                **status[camera_id],
+                'stats': camera_stats_json(camera_id)
+            }
+            for camera_id, config in CAMERAS.items()
+        ]
+    return jsonify({'success': True, 'default': DEFAULT_CAMERA, 'cameras': cameras})
+
+@app.route('/api/model-tiers', methods=['GET'])
+def get_model_tiers():
+    """List the OpenCV model tiers and what each endpoint currently uses"""
+    return jsonify({
+        'success': True,
+        'available': opencv_models.available(),
+        'loaded': opencv_models.loaded(),
+        'default': DEFAULT_OPENCV_TIER,
+        'endpoints': ENDPOINT_MODEL_TIERS,
+        'adaptive': tier_controller is not None,
+        'adaptive_tier': tier_controller.ladder[tier_controller.level] if tier_controller and tier_controller.ladder else None,
+        'latency': round(tier_controller.latency, 3) if tier_controller else None
+    })
 
 # =============================================================================
 # FLASK ROUTES - IMAGE UPLOAD
@@ -447,13 +925,18 @@ def upload_image():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
+    try:
+        tier = requested_tier('image')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     filename = f"upload_{timestamp}_{file.filename}"
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     file.save(filepath)
     
     try:
-        result_image, count, breakdown, detections = detect_vehicles_image(filepath)
+        result_image, detections = detect_vehicles_image(filepath, tier)
         
         result_filename = f"result_{timestamp}_{file.filename}"
         result_path = os.path.join(app.config['RESULTS_FOLDER'], result_filename)
@@ -464,13 +947,16 @@ def upload_image():
         
         return jsonify({
             'success': True,
-            'vehicle_count': count,
-            'breakdown': breakdown,
-            'detections': detections,
+            'vehicle_count': len(detections),
+            'breakdown': detections.breakdown(),
+            'detections': detections.to_json(),
             'result_image': f"data:image/jpeg;base64,{img_base64}",
             'result_filename': result_filename
         })
     
+    except DetectorBusyError as e:
+        # Detector queue is full: a signal to retry, not a server error
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -478,39 +964,89 @@ def upload_image():
 # FLASK ROUTES - MULTI-LANE
 # =============================================================================
 
+def density_signal_decision(lane_names, counts):
+    """Signal decision giving green to the lane with the most vehicles"""
+    max_idx = counts.index(max(counts)) if counts else 0
+    
+    return {
+        'green_lane': lane_names[max_idx],
+        'green_lane_count': counts[max_idx],
+        'total_vehicles': sum(counts),
+        'signals': [
+            {
+                'lane': lane_names[i],
+                'status': 'GREEN' if i == max_idx else 'RED',
+                'count': counts[i]
+            }
+            for i in range(len(lane_names))
+        ]
+    }
+
+@app.route('/api/cameras/<camera_id>/signal', methods=['GET'])
+def get_camera_signal(camera_id):
+    """Signal decision from one camera's live per-lane counts"""
+    lanes = camera_lanes.get(camera_id)
+    if lanes is None:
+        return jsonify({'error': f'No lanes configured for camera: {camera_id}'}), 404
+    
+    with stats_lock:
+        lane_counts = dict(camera_stats[camera_id]['lanes'])
+        priority_lanes = list(camera_stats[camera_id]['emergency_lanes'])
+    counts = [lane_counts.get(name, 0) for name in lanes.names]
+    
+    signal_decision = density_signal_decision(lanes.names, counts)
+    if priority_lanes:
+        # A confirmed live emergency preempts traffic density
+        green_lane = max(priority_lanes, key=lambda name: lane_counts.get(name, 0))
+        signal_decision['green_lane'] = green_lane
+        signal_decision['green_lane_count'] = lane_counts.get(green_lane, 0)
+        signal_decision['priority_reason'] = f"Emergency vehicle detected in {green_lane} lane."
+        for signal in signal_decision['signals']:
+            signal['status'] = 'GREEN' if signal['lane'] == green_lane else 'RED'
+            signal['has_emergency'] = signal['lane'] in priority_lanes
+    
+    return jsonify({
+        'success': True,
+        'camera': camera_id,
+        'signal_decision': signal_decision
+    })
+
+@app.route('/api/emergency-events', methods=['GET'])
+def get_emergency_events():
+    """Most recent live emergency events, newest first"""
+    return jsonify({'success': True, 'events': list(reversed(emergency_events))})
+
 @app.route('/upload-multi', methods=['POST'])
 def upload_multi():
     """Handle multiple image uploads for 4-way intersection"""
+    try:
+        tier = requested_tier('multi')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     lane_names = ['North', 'East', 'South', 'West']
-    results = []
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     
-    for idx, lane in enumerate(lane_names):
-        file_key = f'lane{idx + 1}'
-        
-        if file_key not in request.files:
-            results.append({
-                'lane': lane,
-                'error': 'No image uploaded',
-                'count': 0
-            })
-            continue
-        
-        file = request.files[file_key]
-        if file.filename == '':
-            results.append({
-                'lane': lane,
-                'error': 'No file selected',
-                'count': 0
-            })
-            continue
-        
-        filename = f"{timestamp}_{lane}_{file.filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
+    # Decode every lane up front so all lanes share one batched forward pass
+    results, lane_images = read_lane_uploads(lane_names, timestamp, error_fields={'count': 0})
+    
+    lane_indices = list(lane_images)
+    try:
+        detections = detect_vehicles_opencv_batch([lane_images[idx][1] for idx in lane_indices], tier=tier)
+    except DetectorBusyError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        detections = []
+        for idx in lane_indices:
+            results[idx] = {'lane': lane_names[idx], 'error': str(e), 'count': 0}
+    
+    for idx, lane_detections in zip(lane_indices, detections):
+        lane = lane_names[idx]
         try:
-            result_image, count, breakdown, _ = detect_vehicles_image(filepath)
+            result_image = lane_images[idx][1]
+            count = len(lane_detections)
+            render_vehicle_detections(result_image, lane_detections)
+            draw_summary_overlay(result_image, count)
             
             result_filename = f"result_{timestamp}_{lane}.jpg"
             result_path = os.path.join(app.config['RESULTS_FOLDER'], result_filename)
@@ -519,42 +1055,27 @@ def upload_multi():
             _, buffer = cv2.imencode('.jpg', result_image)
             img_base64 = base64.b64encode(buffer).decode('utf-8')
             
-            results.append({
+            results[idx] = {
                 'lane': lane,
                 'count': count,
-                'breakdown': breakdown,
+                'breakdown': lane_detections.breakdown(),
                 'result_image': f"data:image/jpeg;base64,{img_base64}",
                 'result_filename': result_filename
-            })
+            }
         except Exception as e:
-            results.append({
+            results[idx] = {
                 'lane': lane,
                 'error': str(e),
                 'count': 0
-            })
+            }
     
     # Determine signal control
     counts = [r.get('count', 0) for r in results]
-    max_idx = counts.index(max(counts)) if counts else 0
-    
-    signal_decision = {
-        'green_lane': lane_names[max_idx],
-        'green_lane_count': counts[max_idx],
-        'total_vehicles': sum(counts),
-        'signals': [
-            {
-                'lane': lane_names[i],
-                'status': 'GREEN' if i == max_idx else 'RED',
-                'count': counts[i]
-            }
-            for i in range(len(lane_names))
-        ]
-    }
     
     return jsonify({
         'success': True,
         'results': results,
-        'signal_decision': signal_decision
+        'signal_decision': density_signal_decision(lane_names, counts)
     })
 
 # =============================================================================
@@ -567,75 +1088,56 @@ def upload_emergency():
     if not EMERGENCY_MODEL_AVAILABLE:
         return jsonify({'error': 'Emergency vehicle detection model not available'}), 503
     
+    try:
+        tier = requested_tier('emergency')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     lane_names = ['North', 'East', 'South', 'West']
-    results = []
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    error_fields = {'count': 0, 'emergency_count': 0}
     
-    for idx, lane in enumerate(lane_names):
-        file_key = f'lane{idx + 1}'
-        
-        if file_key not in request.files:
-            results.append({
-                'lane': lane,
-                'error': 'No image uploaded',
-                'count': 0,
-                'emergency_count': 0
-            })
-            continue
-        
-        file = request.files[file_key]
-        if file.filename == '':
-            results.append({
-                'lane': lane,
-                'error': 'No file selected',
-                'count': 0,
-                'emergency_count': 0
-            })
-            continue
-        
-        filename = f"{timestamp}_emergency_{lane}_{file.filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
+    # Decode every lane up front so each model sees all lanes in a single call
+    results, lane_images = read_lane_uploads(lane_names, timestamp, prefix='emergency_',
+                                             error_fields=error_fields)
+    lane_indices = list(lane_images)
+    images = [lane_images[idx][1] for idx in lane_indices]
+    
+    emergency_results = []
+    vehicle_results = []
+    if images:
         try:
-            # Read the image
-            print(f"Processing {filename}...")
-            image = cv2.imread(filepath)
-            if image is None:
-                raise ValueError(f"Failed to read image: {filepath}")
-            
-            # Step 1: Detect emergency vehicles using best.pt model (get detections only)
-            print("Running emergency vehicle detection...")
-            temp_image, emergency_count, emergency_detections = detect_emergency_vehicles(image.copy())
-            print(f"Emergency count: {emergency_count}")
-            
-            # Extract bounding boxes of emergency vehicles to exclude from regular detection
-            emergency_bboxes = [det['bbox'] for det in emergency_detections]
+            # Step 1: Detect emergency vehicles in all lanes with one best.pt model call
+            print(f"Running emergency vehicle detection on {len(images)} lanes...")
+            emergency_results = detect_emergency_vehicles_batch(images)
+            print(f"Emergency counts: {[len(detections) for detections in emergency_results]}")
             
-            # Step 2: Detect regular vehicles using OpenCV YOLO (excluding emergency vehicle regions)
+            # Step 2: Detect regular vehicles in all lanes with one batched OpenCV YOLO pass
+            # (excluding emergency vehicle regions)
             print("Running regular vehicle detection...")
-            result_image, vehicle_count, vehicle_breakdown, _ = detect_vehicles_opencv(image.copy(), exclude_boxes=emergency_bboxes)
-            print(f"Regular count: {vehicle_count}")
-            
-            # Step 3: Redraw emergency vehicle bounding boxes on top (RED boxes)
-            for det in emergency_detections:
-                x, y, w, h = det['bbox']
-                x1, y1, x2, y2 = x, y, x + w, y + h
-                
-                # Draw RED bounding box for emergency vehicles
-                color = (0, 0, 255)  # Red color (BGR format)
-                cv2.rectangle(result_image, (x1, y1), (x2, y2), color, 3)
-                
-                # Extract confidence from detection
-                conf_str = det['confidence'].strip('%')
-                conf_float = float(conf_str) / 100.0
-                label = f"AMBULANCE {conf_float:.2f}"
-                
-                # Add text with background for better visibility
-                (text_w, text_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-                cv2.rectangle(result_image, (x1, y1 - text_h - 10), (x1 + text_w, y1), color, -1)
-                cv2.putText(result_image, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 
-                           0.6, (255, 255, 255), 2)
+            emergency_bboxes = [detections.boxes for detections in emergency_results]
+            vehicle_results = detect_vehicles_opencv_batch(images, exclude_boxes=emergency_bboxes, tier=tier)
+            print(f"Regular counts: {[len(detections) for detections in vehicle_results]}")
+        except DetectorBusyError as e:
+            return jsonify({'error': str(e)}), 503
+        except Exception as e:
+            import traceback
+            print(f"ERROR running lane detection: {str(e)}")
+            print(traceback.format_exc())
+            emergency_results = []
+            vehicle_results = []
+            for idx in lane_indices:
+                results[idx] = {'lane': lane_names[idx], 'error': str(e), **error_fields}
+    
+    for idx, emergency_detections, vehicle_detections in zip(lane_indices, emergency_results, vehicle_results):
+        lane = lane_names[idx]
+        result_image = lane_images[idx][1]
+        emergency_count = len(emergency_detections)
+        vehicle_count = len(vehicle_detections)
+        try:
+            # Step 3: Draw regular vehicles, then emergency vehicles on top (RED boxes)
+            render_vehicle_detections(result_image, vehicle_detections)
+            render_emergency_detections(result_image, emergency_detections)
             
             # Add summary overlay
             summary = f"Total: {vehicle_count} | Emergency: {emergency_count}"
@@ -664,24 +1166,23 @@ def upload_emergency():
             _, buffer = cv2.imencode('.jpg', display_image, encode_param)
             img_base64 = base64.b64encode(buffer).decode('utf-8')
             
-            results.append({
+            results[idx] = {
                 'lane': lane,
                 'count': vehicle_count,
                 'emergency_count': emergency_count,
-                'breakdown': vehicle_breakdown,
+                'breakdown': vehicle_detections.breakdown(),
                 'result_image': f"data:image/jpeg;base64,{img_base64}",
                 'result_filename': result_filename
-            })
+            }
         except Exception as e:
             import traceback
             print(f"ERROR processing {lane}: {str(e)}")
             print(traceback.format_exc())
-            results.append({
+            results[idx] = {
                 'lane': lane,
                 'error': str(e),
-                'count': 0,
-                'emergency_count': 0
-            })
+                **error_fields
+            }
     
     # PRIORITY SIGNAL CONTROL LOGIC
     # Priority 1: Lanes with emergency vehicles
@@ -737,9 +1238,176 @@ def upload_emergency():
 # FLASK ROUTES - VIDEO UPLOAD
 # =============================================================================
 
+video_jobs = VideoJobManager(workers=VIDEO_JOB_WORKERS, max_queued=VIDEO_JOB_MAX_QUEUED)
+
+def detect_video_frames(job, cap, tier, sample_rate, fps):
+    """Yield (frame number, Detections, frame) for the sampled frames, in this process"""
+    # Only sampled frames are decoded; the rest are grabbed or seeked past
+    for frame_number, frame in sample_frames(cap, sample_rate, fps=fps):
+        job.check_cancelled()
+        # Detect vehicles using OpenCV YOLO (more accurate)
+        yield frame_number, detect_vehicles_opencv(frame, tier=tier), frame
+
+def detect_video_segments(job, filepath, segments, tier, sample_rate, fps):
+    """Yield (frame number, Detections, None) for the sampled frames, in video
+    order, from VIDEO_SEGMENT_WORKERS worker processes"""
+    config = {
+        'opencv': dict(opencv_settings, **OPENCV_MODEL_TIERS[tier]),
+        'num_threads': max(1, (os.cpu_count() or 1) // VIDEO_SEGMENT_WORKERS)
+    }
+    for frame_number, (boxes, confidences, classIDs) in analyze_segments(
+            config, filepath, segments, sample_rate, fps, VIDEO_SEGMENT_WORKERS,
+            check_cancelled=job.check_cancelled):
+        yield frame_number, Detections(boxes, confidences, classIDs, LABELS), None
+
+def preview_frame(previews, frame_number):
+    """Advance a sample_frames generator to frame_number and return that frame
+    
+    Raises RuntimeError if the sampler never lands on it, rather than
+    drawing detections on the wrong frame
+    """
+    for number, frame in previews:
+        if number == frame_number:
+            return frame
+        if number > frame_number:
+            break
+    raise RuntimeError(f"Could not decode frame {frame_number} of the video for annotation")
+
+def analyze_video(job, filepath, tier, timestamp, sample_rate=VIDEO_SAMPLE_RATE, output=VIDEO_OUTPUT_MODE):
+    """Frame-by-frame detection for one uploaded video (runs as a VideoJob)
+    
+    Per-frame results are published on the job as they are produced; the
+    return value is the final result.
+    
+    Args:
+        output: 'frames' or 'video' (see VIDEO_OUTPUT_MODE)
+    """
+    # Open video
+    cap = cv2.VideoCapture(filepath)
+    writer = None
+    try:
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = video_fps(cap)
+        job.set_total(total_frames)
+        
+        segments = [(0, None)]
+        if VIDEO_SEGMENT_WORKERS > 1 and total_frames > 0:
+            segments = split_segments(total_frames, VIDEO_SEGMENT_WORKERS * VIDEO_SEGMENTS_PER_WORKER,
+                                      VIDEO_SEGMENT_MIN_FRAMES)
+        if len(segments) > 1:
+            print(f"→ Video job {job.id}: {len(segments)} segments on {VIDEO_SEGMENT_WORKERS} workers")
+            results = detect_video_segments(job, filepath, segments, tier, sample_rate, fps)
+            # Workers return detections only; the few frames that get annotated
+            # are decoded again here
+            previews = sample_frames(cap, sample_rate, fps=fps)
+        else:
+            results = detect_video_frames(job, cap, tier, sample_rate, fps)
+        
+        if output == 'video':
+            # One output frame per sampled frame, so the video plays in real time
+            writer = AnnotatedVideoWriter(app.config['VIDEO_FRAMES_FOLDER'],
+                                          f"annotated_{timestamp}_{job.id}.mp4",
+                                          fps=min(fps, sample_rate), source_fps=fps,
+                                          fourcc=VIDEO_OUTPUT_FOURCC)
+        
+        # Peak, average and breakdown are kept as running totals on the job,
+        # so memory does not grow with the length of the video
+        result_frames = []
+        
+        for frame_number, detections, frame in results:
+            frame_filename = None
+            if writer is not None:
+                if frame is None:
+                    frame = preview_frame(previews, frame_number)
+                position = writer.write(render_vehicle_detections(frame, detections), frame_number)
+                frame_filename = thumbnail_name(writer.filename, position)
+            elif len(result_frames) < VIDEO_RESULT_FRAMES:
+                # Only frames returned to the client are annotated and saved
+                if frame is None:
+                    frame = preview_frame(previews, frame_number)
+                frame_filename = f"frame_{timestamp}_{job.id}_{len(result_frames):04d}.jpg"
+                frame_path = os.path.join(app.config['VIDEO_FRAMES_FOLDER'], frame_filename)
+                cv2.imwrite(frame_path, render_vehicle_detections(frame, detections))
+            
+            frame_result = {
+                'frame_number': frame_number,
+                'vehicle_count': len(detections),
+                'breakdown': detections.breakdown(),
+                'frame_image': frame_filename
+            }
+            if frame_filename is not None and len(result_frames) < VIDEO_RESULT_FRAMES:
+                result_frames.append(frame_result)
+            job.add_frame(frame_result, frame_number + 1)
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.close()
+    
+    totals = job.totals()
+    result = {
+        'success': True,
+        'total_frames': total_frames,
+        'processed_frames': totals['processed_frames'],
+        'fps': round(fps, 2),
+        'sample_rate': sample_rate,
+        'total_vehicles': totals['total_vehicles'],  # Now shows peak instead of cumulative
+        'avg_vehicles_per_frame': totals['avg_vehicles_per_frame'],
+        'overall_breakdown': totals['overall_breakdown'],
+        'frames': result_frames
+    }
+    if writer is not None and writer.frame_numbers:
+        result['annotated_video'] = f"/frames/{writer.filename}"
+        result['frame_index'] = f"/frames/{writer.index_filename}"
+    return result
+
+def stream_video_job(job, since=0, owner=False):
+    """NDJSON lines for a video job: one per analyzed frame as soon as it is
+    ready, then one 'summary' line with the final status and result
+    
+    Args:
+        since: First frame index to send
+        owner: This stream is the job's only consumer (stream=1 upload): it
+               discards frames once sent and cancels the job if the client
+               goes away before the end
+    """
+    def lines():
+        sent = since
+        finished = False
+        try:
+            while True:
+                # Check before reading so frames added just before the end are not lost
+                finished = job.finished
+                first, frames = job.frames_since(sent)
+                for frame_result in frames:
+                    line = dict(frame_result, type='frame')
+                    if frame_result['frame_image']:
+                        line['frame_url'] = f"/frames/{frame_result['frame_image']}"
+                    yield json.dumps(line) + "\n"
+                sent = first + len(frames)
+                if owner and not job.retain_frames:
+                    job.discard_frames(sent)
+                if finished:
+                    break
+                if not job.wait_frames(sent, timeout=15):
+                    # Blank line keeps proxies from closing an idle stream
+                    yield "\n"
+            yield json.dumps({'type': 'summary', **job.summary()}) + "\n"
+        finally:
+            if owner and not finished:
+                video_jobs.cancel(job.id)
+    
+    return Response(lines(), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/upload-video', methods=['POST'])
 def upload_video():
-    """Handle video upload and frame-by-frame detection"""
+    """Handle video upload; analysis runs as a background job
+    
+    Returns 202 with the job ID; poll /api/video-jobs/<job_id> for progress,
+    partial results and the final result. With stream=1 the response is
+    instead an NDJSON stream of per-frame results (see stream_video_job);
+    the job is cancelled if the client disconnects.
+    """
     if 'video' not in request.files:
         return jsonify({'error': 'No video uploaded'}), 400
     
@@ -747,77 +1415,90 @@ def upload_video():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
+    try:
+        tier = requested_tier('video')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        sample_rate = float(request.values.get('sample_rate', VIDEO_SAMPLE_RATE))
+    except ValueError:
+        sample_rate = None
+    if sample_rate is None or not 0 < sample_rate <= VIDEO_MAX_SAMPLE_RATE:
+        return jsonify({'error': f'sample_rate must be between 0 and {VIDEO_MAX_SAMPLE_RATE} frames per second'}), 400
+    
+    output = request.values.get('output', VIDEO_OUTPUT_MODE)
+    if output not in ('frames', 'video'):
+        return jsonify({'error': "output must be 'frames' or 'video'"}), 400
+    
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"video_{timestamp}_{file.filename}"
+    # Uploads in the same second must not overwrite each other
+    filename = f"video_{timestamp}_{uuid.uuid4().hex[:8]}_{file.filename}"
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     file.save(filepath)
     
+    stream = request.values.get('stream', '0').lower() in ('1', 'true', 'yes')
     try:
-        # Open video
-        cap = cv2.VideoCapture(filepath)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
-        
-        # Process every nth frame to speed up
-        frame_skip = max(1, fps // 2)  # Process 2 frames per second
-        
-        frame_results = []
-        max_vehicles = 0  # Track peak vehicles in a single frame
-        total_vehicles_sum = 0  # For calculating average
-        overall_breakdown = {}
-        frame_count = 0
-        processed_count = 0
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # Only process every nth frame
-            if frame_count % frame_skip == 0:
-                # Detect vehicles using OpenCV YOLO (more accurate)
-                processed_frame, count, breakdown, _ = detect_vehicles_opencv(frame.copy())
-                
-                # Save processed frame
-                frame_filename = f"frame_{timestamp}_{processed_count:04d}.jpg"
-                frame_path = os.path.join(app.config['VIDEO_FRAMES_FOLDER'], frame_filename)
-                cv2.imwrite(frame_path, processed_frame)
-                
-                # Update statistics
-                max_vehicles = max(max_vehicles, count)  # Track peak
-                total_vehicles_sum += count  # For average calculation
-                
-                for vtype, vcount in breakdown.items():
-                    overall_breakdown[vtype] = overall_breakdown.get(vtype, 0) + vcount
-                
-                frame_results.append({
-                    'frame_number': frame_count,
-                    'vehicle_count': count,
-                    'breakdown': breakdown,
-                    'frame_image': frame_filename
-                })
-                
-                processed_count += 1
-            
-            frame_count += 1
-        
-        cap.release()
-        
-        avg_vehicles = round(total_vehicles_sum / processed_count, 1) if processed_count > 0 else 0
-        
-        return jsonify({
-            'success': True,
-            'total_frames': total_frames,
-            'processed_frames': processed_count,
-            'fps': fps,
-            'total_vehicles': max_vehicles,  # Now shows peak instead of cumulative
-            'avg_vehicles_per_frame': avg_vehicles,
-            'overall_breakdown': overall_breakdown,
-            'frames': frame_results[:20]  # Return first 20 frames
-        })
+        job = video_jobs.submit(file.filename, analyze_video, filepath, tier, timestamp, sample_rate,
+                                output, retain_frames=not stream)
+    except VideoQueueFullError as e:
+        return jsonify({'error': str(e)}), 503
     
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    if stream:
+        return stream_video_job(job, owner=True)
+    
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status_url': f"/api/video-jobs/{job.id}"
+    }), 202
+
+@app.route('/api/video-jobs', methods=['GET'])
+def list_video_jobs():
+    """Status of every known video job, newest first"""
+    return jsonify({'success': True, 'jobs': [job.summary() for job in reversed(video_jobs.list())]})
+
+@app.route('/api/video-jobs/<job_id>', methods=['GET'])
+def get_video_job(job_id):
+    """Progress, running totals and (once done) the final result of a video job"""
+    job = video_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown video job: {job_id}'}), 404
+    return jsonify({'success': True, **job.summary()})
+
+@app.route('/api/video-jobs/<job_id>/frames', methods=['GET'])
+def get_video_job_frames(job_id):
+    """Per-frame results produced so far; ?since=N skips the first N"""
+    job = video_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown video job: {job_id}'}), 404
+    since, frames = job.frames_since(request.args.get('since', 0, type=int))
+    return jsonify({
+        'success': True,
+        'status': job.status,
+        'since': since,
+        'next': since + len(frames),
+        'frames': frames
+    })
+
+@app.route('/api/video-jobs/<job_id>/stream', methods=['GET'])
+def stream_video_job_frames(job_id):
+    """NDJSON stream of a job's per-frame results and final summary; ?since=N skips the first N"""
+    job = video_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown video job: {job_id}'}), 404
+    if not job.retain_frames:
+        # Frames of a streamed upload are dropped as its own stream sends them
+        return jsonify({'error': 'Video job is streamed to its uploader and cannot be streamed again'}), 409
+    return stream_video_job(job, since=request.args.get('since', 0, type=int))
+
+@app.route('/api/video-jobs/<job_id>/cancel', methods=['POST'])
+def cancel_video_job(job_id):
+    """Stop a queued or running video job; frames already analyzed stay available"""
+    job = video_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown video job: {job_id}'}), 404
+    return jsonify({'success': True, 'job_id': job.id, 'status': job.status})
 
 
 # =============================================================================
@@ -831,8 +1512,22 @@ def get_result(filename):
 
 @app.route('/frames/<filename>')
 def get_frame(filename):
-    """Serve video frames"""
-    return send_from_directory(app.config['VIDEO_FRAMES_FOLDER'], filename)
+    """Serve video frames, annotated videos and their indexes
+    
+    Thumbnails of annotated videos are not stored; they are cut from the MP4
+    when requested. Until the job has finished its video they answer 409 with
+    Retry-After.
+    """
+    folder = app.config['VIDEO_FRAMES_FOLDER']
+    if not os.path.isfile(os.path.join(folder, filename)):
+        try:
+            thumbnail = read_thumbnail(folder, filename, width=VIDEO_THUMBNAIL_WIDTH)
+        except VideoNotReadyError as e:
+            return jsonify({'error': str(e)}), 409, {'Retry-After': '2'}
+        if thumbnail is not None:
+            return Response(thumbnail, mimetype='image/jpeg',
+                            headers={'Cache-Control': 'public, max-age=86400'})
+    return send_from_directory(folder, filename)
 
 # =============================================================================
 # SHORTEST PATH ROUTING
@@ -937,8 +1632,11 @@ if __name__ == '__main__':
     print(f"\n🎮 Device: {current_stats['device']}")
     print("\n🌐 Starting unified web server...")
     print("📍 Backend running on: http://localhost:5005")
-    print("\n📹 Camera source:", camera_source)
+    print("\n📹 Cameras:")
+    for camera_id, config in CAMERAS.items():
+        print(f"   {camera_id}: {config['source']} @ {config.get('fps', 15)} FPS")
     print("=" * 70 + "\n")
     
+    live_cameras.start_monitoring()
     app.run(debug=False, host='0.0.0.0', port=5005, threaded=True)
 
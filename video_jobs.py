@@ -0,0 +1,217 @@
+"""
+Background video analysis jobs
+Uploads return a job ID straight away; a small bounded pool of worker threads
+analyzes the videos while clients poll progress and partial results or cancel
+"""
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's analysis function once the job is cancelled"""
+
+
+class VideoQueueFullError(RuntimeError):
+    """Raised when too many video jobs are already waiting"""
+
+
+class VideoJob:
+    def __init__(self, job_id, filename, retain_frames=True):
+        """
+        Args:
+            retain_frames: Keep every per-frame result for frames_since();
+                           when False the consumer drops the ones it has
+                           handled with discard_frames() (streamed jobs)
+        """
+        self.id = job_id
+        self.filename = filename
+        self.status = 'queued'  # queued, running, done, failed, cancelled
+        self.retain_frames = retain_frames
+        self.total_frames = 0
+        self.position = 0       # Frames of the video gone through so far
+        self.frames = []        # Per-frame results in video order, from index _first
+        self.result = None
+        self.error = None
+        self.created = datetime.now()
+
+        self._peak = 0
+        self._vehicle_sum = 0
+        self._breakdown = {}
+        self._first = 0
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self.future = None
+
+    def set_total(self, total_frames):
+        with self._lock:
+            self.total_frames = total_frames
+
+    def add_frame(self, frame_result, position):
+        """Record one analyzed frame ({'vehicle_count', 'breakdown', ...})
+
+        Args:
+            position: Frames of the video gone through, for progress
+        """
+        with self._lock:
+            self.frames.append(frame_result)
+            self.position = position
+            self._peak = max(self._peak, frame_result['vehicle_count'])
+            self._vehicle_sum += frame_result['vehicle_count']
+            for vtype, vcount in frame_result['breakdown'].items():
+                self._breakdown[vtype] = self._breakdown.get(vtype, 0) + vcount
+            self._changed.notify_all()
+
+    def set_status(self, status):
+        with self._changed:
+            self.status = status
+            self._changed.notify_all()
+
+    def check_cancelled(self):
+        """Called by the analysis loop between frames"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    @property
+    def processed(self):
+        """Frames analyzed so far, including discarded ones"""
+        return self._first + len(self.frames)
+
+    def frames_since(self, start=0):
+        """Per-frame results from index start on
+
+        Returns:
+            (index of the first returned frame, frames); the index is above
+            start when earlier frames have been discarded
+        """
+        with self._lock:
+            first = max(start, self._first)
+            return first, self.frames[first - self._first:]
+
+    def discard_frames(self, end):
+        """Drop per-frame results before index end to keep memory flat"""
+        with self._lock:
+            if end > self._first:
+                del self.frames[:end - self._first]
+                self._first = end
+
+    def wait_frames(self, start, timeout=None):
+        """Block until a frame past index start exists or the job has finished"""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.processed > start or self.finished, timeout)
+
+    def totals(self):
+        """Running totals over every frame analyzed so far"""
+        with self._lock:
+            return self._totals()
+
+    def _totals(self):
+        processed = self.processed
+        return {
+            'processed_frames': processed,
+            'total_vehicles': self._peak,
+            'avg_vehicles_per_frame': round(self._vehicle_sum / processed, 1) if processed else 0,
+            'overall_breakdown': dict(self._breakdown)
+        }
+
+    def summary(self):
+        """Status, progress and running totals as returned by the job API"""
+        with self._lock:
+            totals = self._totals()
+            if self.status == 'done':
+                progress = 100.0
+            elif self.total_frames > 0:
+                progress = round(min(100.0, 100.0 * self.position / self.total_frames), 1)
+            else:
+                progress = 0.0
+            summary = {
+                'job_id': self.id,
+                'filename': self.filename,
+                'status': self.status,
+                'progress': progress,
+                'processed_frames': totals.pop('processed_frames'),
+                'total_frames': self.total_frames,
+                'partial': totals,
+                'created': self.created.strftime("%Y-%m-%d %H:%M:%S")
+            }
+            if self.result is not None:
+                summary['result'] = self.result
+            if self.error is not None:
+                summary['error'] = self.error
+            return summary
+
+
+class VideoJobManager:
+    def __init__(self, workers=1, max_queued=8, max_jobs=100):
+        """
+        Args:
+            workers: Videos analyzed at the same time (kept low so video jobs
+                     do not starve live detection)
+            max_queued: Jobs allowed to wait for a worker before uploads are refused
+            max_jobs: Finished jobs kept for status queries; oldest are dropped first
+        """
+        self.max_queued = max_queued
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='video-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, filename, analyze, *args, retain_frames=True):
+        """Queue analyze(job, *args); its return value becomes the job result
+
+        Raises VideoQueueFullError when max_queued jobs are already waiting
+        """
+        with self._lock:
+            queued = sum(1 for job in self._jobs.values() if job.status == 'queued')
+            if queued >= self.max_queued:
+                raise VideoQueueFullError("Too many videos waiting, try again later")
+            job = VideoJob(uuid.uuid4().hex[:12], filename, retain_frames)
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self._executor.submit(self._run, job, analyze, args)
+        return job
+
+    def _run(self, job, analyze, args):
+        if job._cancel.is_set():
+            job.set_status('cancelled')
+            return
+        job.set_status('running')
+        try:
+            job.result = analyze(job, *args)
+            job.set_status('done')
+        except JobCancelled:
+            job.set_status('cancelled')
+        except Exception as e:
+            job.error = str(e)
+            job.set_status('failed')
+            print(f"⚠ Video job {job.id} failed: {e}")
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_jobs)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        """Ask a job to stop; returns the job, or None if it does not exist"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job._cancel.set()
+        if job.future is not None and job.future.cancel():
+            job.set_status('cancelled')
+        return job
@@ -0,0 +1,115 @@
+"""
+Annotated video output for video analysis
+Analyzed frames go into one MP4 through cv2.VideoWriter, with a JSON index
+mapping each output frame to its source frame number and timestamp;
+thumbnails are cut from the MP4 only when someone asks for them
+"""
+import json
+import os
+import re
+
+import cv2
+
+# <video stem>_<output frame position>.jpg
+THUMBNAIL_PATTERN = re.compile(r'^(?P<stem>[\w\-.]+)_(?P<position>\d{6})\.jpg$')
+
+
+class VideoNotReadyError(RuntimeError):
+    """Raised when a thumbnail is asked for before its video has been finished"""
+
+
+def thumbnail_name(video_filename, position):
+    """Lazy thumbnail filename for one output frame of an annotated video"""
+    return f"{os.path.splitext(video_filename)[0]}_{position:06d}.jpg"
+
+
+class AnnotatedVideoWriter:
+    def __init__(self, folder, filename, fps, source_fps, fourcc='mp4v'):
+        """
+        Args:
+            folder: Directory the MP4 and its index are written to
+            filename: MP4 filename; the index is the same name with .json
+            fps: Output frame rate (the rate frames were sampled at)
+            source_fps: Frame rate of the analyzed video, for timestamps
+            fourcc: Codec; 'avc1' gives browser-playable H.264 where the
+                    OpenCV build supports it
+        """
+        self.filename = filename
+        self.index_filename = f"{os.path.splitext(filename)[0]}.json"
+        self.path = os.path.join(folder, filename)
+        self.index_path = os.path.join(folder, self.index_filename)
+        self.fps = fps
+        self.source_fps = source_fps
+        self.fourcc = fourcc
+
+        self.frame_numbers = []  # Source frame number of each output frame
+        self._writer = None
+
+    def write(self, frame, frame_number):
+        """Append one annotated frame; returns its position in the output video"""
+        if self._writer is None:
+            H, W = frame.shape[:2]
+            self._writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc),
+                                           self.fps, (W, H))
+            if not self._writer.isOpened():
+                raise RuntimeError(f"Could not open video writer ({self.fourcc}) for {self.filename}")
+        self._writer.write(frame)
+        self.frame_numbers.append(frame_number)
+        return len(self.frame_numbers) - 1
+
+    def close(self):
+        """Finish the MP4 and write the frame index next to it"""
+        if self._writer is None:
+            return
+        self._writer.release()
+        self._writer = None
+        with open(self.index_path, 'w') as f:
+            json.dump(self.index(), f)
+
+    def index(self):
+        return {
+            'video': self.filename,
+            'fps': self.fps,
+            'source_fps': self.source_fps,
+            'frames': [
+                {'position': position, 'frame_number': frame_number,
+                 'timestamp': round(frame_number / self.source_fps, 3)}
+                for position, frame_number in enumerate(self.frame_numbers)
+            ]
+        }
+
+
+def read_thumbnail(folder, filename, width=480, quality=80):
+    """JPEG bytes for a lazy thumbnail name, cut from its annotated video
+
+    The MP4 cannot be read until AnnotatedVideoWriter.close() has finished
+    it, which is also when its index is written; until then this raises
+    VideoNotReadyError.
+
+    Returns:
+        Encoded JPEG bytes, or None if the name does not refer to an existing
+        annotated video frame
+    """
+    match = THUMBNAIL_PATTERN.match(filename)
+    if match is None:
+        return None
+    video_path = os.path.join(folder, f"{match['stem']}.mp4")
+    if not os.path.isfile(video_path):
+        return None
+    if not os.path.isfile(os.path.join(folder, f"{match['stem']}.json")):
+        raise VideoNotReadyError(f"{match['stem']}.mp4 is still being written")
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(match['position']))
+        ret, frame = cap.read()
+    finally:
+        cap.release()
+    if not ret:
+        return None
+
+    H, W = frame.shape[:2]
+    if W > width:
+        frame = cv2.resize(frame, (width, round(H * width / W)), interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes() if ok else None
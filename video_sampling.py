@@ -0,0 +1,66 @@
+"""
+Frame sampling for video analysis
+Only sampled frames are retrieved (decoded to BGR and copied out); frames in
+between are stepped over with grab(), or skipped with a seek when the gap is
+long enough that seeking to a keyframe is cheaper than grabbing through
+"""
+import cv2
+
+DEFAULT_FPS = 30.0  # Assumed when the container does not report a frame rate
+
+
+def video_fps(cap):
+    """Frame rate reported by the capture, or DEFAULT_FPS when it reports 0/NaN"""
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    return fps if fps and fps > 0 else DEFAULT_FPS
+
+
+def sample_frames(cap, sample_rate, fps=None, start=0, end=None, seek_gap=300):
+    """Yield (frame number, frame) for frames sampled at sample_rate per second of video
+
+    Samples land on frame numbers round(k * fps / sample_rate) counted from
+    frame 0, so any start/end range yields the same frames as the whole video.
+
+    Args:
+        cap: Opened cv2.VideoCapture
+        sample_rate: Frames to analyze per second of video; at or above the
+                     video frame rate every frame is yielded
+        fps: Video frame rate (defaults to video_fps(cap))
+        start: First frame number of the range to sample
+        end: Frame number to stop before (None for the end of the video)
+        seek_gap: Seek instead of grabbing when at least this many frames
+                  would be skipped
+    """
+    fps = fps or video_fps(cap)
+    step = max(1.0, fps / sample_rate)
+
+    # First sample index at or after start
+    k = int(start // step)
+    while round(k * step) < start:
+        k += 1
+
+    position = start
+    if start > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    while True:
+        target = int(round(k * step))
+        if end is not None and target >= end:
+            return
+
+        gap = target - position
+        if gap >= seek_gap:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            position = target
+        else:
+            while position < target:
+                if not cap.grab():
+                    return
+                position += 1
+
+        ret, frame = cap.read()
+        if not ret:
+            return
+        position += 1
+        yield target, frame
+        k += 1
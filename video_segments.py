@@ -0,0 +1,193 @@
+"""
+Segmented video analysis across worker processes
+A video is split into frame ranges; each worker process opens the file itself,
+seeks to a range, samples and detects, and the per-segment results are merged
+back in video order
+"""
+import queue
+import subprocess
+import sys
+import threading
+
+from inference_workers import InferenceWorkerError, connect_to_parent, start_worker_process
+
+
+def split_segments(total_frames, count, min_frames=1):
+    """Split a video into up to count contiguous (start, end) frame ranges
+
+    Ranges are at least min_frames long. The last range ends at None (the end
+    of the video) because CAP_PROP_FRAME_COUNT is only an estimate for many
+    containers.
+    """
+    count = max(1, min(count, total_frames // max(1, min_frames)))
+    bounds = [round(i * total_frames / count) for i in range(count)] + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class SegmentWorker:
+    def __init__(self, config, startup_timeout=300.0):
+        """Start one segment worker process and wait until its net is loaded
+
+        Args:
+            config: Dict with 'opencv' (DetectorSession keyword arguments) and
+                    'num_threads' (OpenCV threads)
+            startup_timeout: Seconds to wait for the model to load
+        """
+        self.process, self.conn = start_worker_process(__file__, startup_timeout)
+        self.conn.send(config)
+        if not self.conn.poll(startup_timeout):
+            self.kill()
+            raise InferenceWorkerError("Segment worker did not finish loading its model")
+        status, payload = self.conn.recv()
+        if status != 'ready':
+            self.kill()
+            raise InferenceWorkerError(f"Segment worker failed to start: {payload}")
+
+    def analyze(self, filepath, start, end, sample_rate, fps):
+        """Sample and detect one frame range
+
+        Returns:
+            List of (frame number, (boxes, confidences, class IDs)) in frame order
+        """
+        try:
+            self.conn.send((filepath, start, end, sample_rate, fps))
+            status, payload = self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise InferenceWorkerError(f"Segment worker exited: {e}") from None
+        if status != 'ok':
+            raise InferenceWorkerError(payload)
+        return payload
+
+    def close(self):
+        """Let the worker process finish and exit"""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.conn.close()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+    def kill(self):
+        """Stop the worker process straight away, even mid-segment"""
+        self.process.kill()
+        self.conn.close()
+
+
+def analyze_segments(config, filepath, segments, sample_rate, fps, workers,
+                     check_cancelled=None, startup_timeout=300.0):
+    """Analyze frame ranges on worker processes, yielding results in video order
+
+    Each worker takes the next unclaimed segment when it finishes one, so a
+    slow range does not hold the others back. Results are yielded as soon as
+    every earlier segment is done. Closing the generator (or check_cancelled
+    raising) kills the workers.
+
+    Args:
+        config: SegmentWorker config
+        filepath: Video file every worker opens
+        segments: (start, end) frame ranges from split_segments
+        sample_rate / fps: Passed to video_sampling.sample_frames
+        workers: Worker processes to start
+        check_cancelled: Called while waiting; raise from it to stop
+
+    Yields:
+        (frame number, (boxes, confidences, class IDs))
+    """
+    pending = queue.Queue()
+    for index, segment in enumerate(segments):
+        pending.put((index, segment))
+    done = queue.Queue()
+    stop = threading.Event()
+    started = []
+
+    def drive():
+        try:
+            worker = SegmentWorker(config, startup_timeout)
+        except Exception as e:
+            done.put((None, e))
+            return
+        started.append(worker)
+        try:
+            while not stop.is_set():
+                try:
+                    index, (start, end) = pending.get_nowait()
+                except queue.Empty:
+                    break
+                done.put((index, worker.analyze(filepath, start, end, sample_rate, fps)))
+        except Exception as e:
+            done.put((None, e))
+        finally:
+            worker.close()
+
+    for _ in range(max(1, min(workers, len(segments)))):
+        threading.Thread(target=drive, daemon=True, name='video-segment').start()
+
+    finished = {}
+    next_index = 0
+    try:
+        while next_index < len(segments):
+            if check_cancelled is not None:
+                check_cancelled()
+            try:
+                index, payload = done.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if index is None:
+                raise payload
+            finished[index] = payload
+            while next_index in finished:
+                yield from finished.pop(next_index)
+                next_index += 1
+    finally:
+        stop.set()
+        for worker in started:
+            if worker.process.poll() is None:
+                worker.kill()
+
+
+# =============================================================================
+# WORKER PROCESS
+# =============================================================================
+
+def serve(host, port):
+    """Worker main loop: load the net, then analyze segments until told to stop"""
+    import cv2
+    from detector import DetectorSession
+    from video_sampling import sample_frames
+
+    conn = connect_to_parent(host, port)
+    config = conn.recv()
+    try:
+        cv2.setNumThreads(config.get('num_threads', 1))
+        session = DetectorSession(**config['opencv'])
+    except Exception as e:
+        conn.send(('error', str(e)))
+        return
+    conn.send(('ready', None))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        filepath, start, end, sample_rate, fps = message
+        cap = cv2.VideoCapture(filepath)
+        try:
+            results = [(frame_number, session.detect(frame))
+                       for frame_number, frame in sample_frames(cap, sample_rate, fps=fps,
+                                                                start=start, end=end)]
+            conn.send(('ok', results))
+        except Exception as e:
+            conn.send(('error', str(e)))
+        finally:
+            cap.release()
+
+
+if __name__ == '__main__':
+    serve(sys.argv[1], int(sys.argv[2]))